@@ -7,8 +7,11 @@ from flask_jwt_extended import JWTManager,create_access_token, jwt_required,get_
 from flask_cors import CORS
 from config import Config
 from .utilis.redis import init_redis
+from .utilis.cache import init_cache
+from .utilis.instrumentation import init_instrumentation
+from .utilis.db_routing import RoutingSession, init_db_routing
 
-db = SQLAlchemy(engine_options=Config.SQLALCHEMY_ENGINE_OPTIONS)
+db = SQLAlchemy(engine_options=Config.SQLALCHEMY_ENGINE_OPTIONS, session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 jwt = JWTManager()
 migrate = Migrate()
@@ -17,13 +20,26 @@ def create_app():
     app = Flask(__name__)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config.from_object(Config)
-    # a central invalidation logic is required
-    # init_redis(app)
+    init_redis(app)
+    init_cache(app)
+    init_instrumentation(app)
     CORS(app)
     db.init_app(app)
+    init_db_routing(app, db)
     migrate.init_app(app,db)
     bcrypt.init_app(app)
     jwt.init_app(app)
+
+    from .utilis.auth_services import init_auth_services
+    from .utilis.certificate_renderer import init_certificates
+    from .utilis.versioning import init_versioning
+    from .utilis.events import init_events
+    from .cli import register_commands
+    init_auth_services(app)
+    init_certificates(app)
+    init_versioning(app)
+    init_events(app)
+    register_commands(app)
     
     # Register blueprints
     from .routes.auth_routes import auth_bp
@@ -32,6 +48,7 @@ def create_app():
     from .routes.auditor_routes import auditor_bp
     from .routes.health_routes import health_bp
     from .routes.verification_routes import verification_bp
+    from .routes.stream_routes import stream_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(NGO_bp)
@@ -39,10 +56,12 @@ def create_app():
     app.register_blueprint(auditor_bp)
     app.register_blueprint(health_bp)
     app.register_blueprint(verification_bp)
+    app.register_blueprint(stream_bp)
     
-    with app.app_context():
-        db.create_all()
-        print("Connected to NeonPostgresql !")
+    if app.config.get('AUTO_CREATE_SCHEMA'):
+        with app.app_context():
+            db.create_all()
+            print("Connected to NeonPostgresql !")
 
     # print(app.url_map)
 
@@ -0,0 +1,41 @@
+"""
+Operational commands, run with ``flask <command>`` (FLASK_APP=run.py).
+"""
+import click
+from flask_migrate import stamp
+from app import db
+
+def register_commands(app):
+    app.cli.add_command(init_db)
+    app.cli.add_command(train_anomaly_model)
+    app.cli.add_command(rescan_duplicates)
+
+@click.command('init-db')
+def init_db():
+    """Create all tables in an empty database and mark it as migrated.
+
+    Existing databases are upgraded with ``flask db upgrade`` instead.
+    """
+    db.create_all()
+    stamp()
+    print("Schema created and stamped at the latest migration")
+
+@click.command('train-anomaly-model')
+@click.option('--incremental', is_flag=True, help="Only add requests newer than the saved model")
+def train_anomaly_model(incremental):
+    """Fit the production anomaly baselines from verification history"""
+    from app.ml_models.anomaly_model import train, model_path
+    model, added = train(incremental=incremental)
+    if not added:
+        print("No new verification requests, model unchanged")
+        return
+    print(f"Added {added} request(s); {len(model.groups)} baseline group(s), "
+          f"version {model.version}, saved to {model_path()}")
+
+@click.command('rescan-duplicates')
+def rescan_duplicates():
+    """Fingerprint unindexed verification requests and recheck all claims for duplicates"""
+    from app.ml_models.duplicates import rescan
+    counts = rescan()
+    print(f"Indexed {counts['indexed']} request(s); {counts['exact']} exact and "
+          f"{counts['near']} near duplicate claim(s) flagged")
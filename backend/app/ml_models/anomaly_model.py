@@ -0,0 +1,242 @@
+"""
+Learned production baselines for anomaly detection.
+
+For every (production method, location) the model keeps the median and the
+median absolute deviation (MAD) of reported efficiency in kWh per kg, fitted
+from VerificationRequest history. A record's robust z-score,
+0.6745 * (efficiency - median) / MAD, says how unusual it is for that site.
+Unlike a mean/stddev z-score it is not dragged towards the very outliers it
+is meant to catch, so the history does not have to be clean. Locations with
+fewer than MIN_GROUP_SIZE records use the method-wide baseline instead.
+
+Training is offline (`flask train-anomaly-model`). The fitted arrays are
+saved with save_artifact and loaded lazily by get_anomaly_model(), which
+also picks up a retrained file. partial_fit() folds new records into each
+group's window of the MAX_GROUP_SAMPLES most recent efficiencies and refits
+only the groups it touched.
+"""
+import os
+import threading
+import time
+import numpy as np
+from flask import current_app, has_app_context
+from app.ml_models.artifacts import save_artifact, load_artifact
+
+ALL_LOCATIONS = '*'
+UNKNOWN_LOCATION = 'unknown'
+MIN_GROUP_SIZE = 10
+MAX_GROUP_SAMPLES = 1000
+MAD_TO_SIGMA = 0.6745
+Z_THRESHOLD = 3.5  # Iglewicz and Hoaglin's cut-off for modified z-scores
+MIN_SCALE_FRACTION = 0.01  # MAD floor relative to the median, for near-constant groups
+DEFAULT_MODEL_PATH = 'instance/anomaly_model.joblib'
+TRAINING_BATCH_SIZE = 10000
+RELOAD_CHECK_INTERVAL = 5.0  # Seconds between checks of the model file for a retrain
+
+def normalize_location(location):
+    return (location or UNKNOWN_LOCATION).strip().lower() or UNKNOWN_LOCATION
+
+class ProductionAnomalyModel:
+    def __init__(self, samples=None, last_request_id=0, version=None):
+        # (method, location) -> efficiencies, oldest first
+        self.samples = dict(samples or {})
+        self.last_request_id = last_request_id
+        self.version = version
+        self._index()
+
+    def state(self):
+        return {
+            'version': self.version,
+            'last_request_id': self.last_request_id,
+            'groups': self.groups,
+            'center': self.center,
+            'scale': self.scale,
+            'count': self.count,
+            'samples': self.samples,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        model = cls.__new__(cls)
+        model.samples = dict(state['samples'])
+        model.last_request_id = state['last_request_id']
+        model.version = state['version']
+        model.groups = list(state['groups'])
+        model.center = state['center']
+        model.scale = state['scale']
+        model.count = state['count']
+        model._positions = {group: i for i, group in enumerate(model.groups)}
+        return model
+
+    def _index(self, touched=None):
+        """Rebuild the group arrays, recomputing statistics for ``touched`` groups only"""
+        previous = {}
+        if touched is not None:
+            previous = {g: (self.center[i], self.scale[i]) for i, g in enumerate(self.groups) if g not in touched}
+        self.groups = sorted(self.samples)
+        self._positions = {group: i for i, group in enumerate(self.groups)}
+        center = np.empty(len(self.groups))
+        scale = np.empty(len(self.groups))
+        for i, group in enumerate(self.groups):
+            if group in previous:
+                center[i], scale[i] = previous[group]
+                continue
+            values = self.samples[group]
+            center[i] = np.median(values)
+            scale[i] = max(np.median(np.abs(values - center[i])), abs(center[i]) * MIN_SCALE_FRACTION)
+        self.center, self.scale = center, scale
+        self.count = np.array([len(self.samples[g]) for g in self.groups], dtype=np.int64)
+
+    def __len__(self):
+        return int(self.count.sum()) if len(self.groups) else 0
+
+    def partial_fit(self, request_ids, methods, locations, efficiency):
+        """Add records (equal-length columns, oldest first) and refit"""
+        efficiency = np.asarray(efficiency, dtype=float)
+        valid = np.isfinite(efficiency) & (efficiency > 0)
+        if not valid.any():
+            return self
+        methods = np.asarray(methods, dtype=object)[valid]
+        locations = np.array([normalize_location(l) for l in np.asarray(locations, dtype=object)[valid]],
+                             dtype=object)
+        efficiency = efficiency[valid]
+
+        updates = {}
+        for method in np.unique(methods):
+            in_method = methods == method
+            updates[(method, ALL_LOCATIONS)] = efficiency[in_method]
+            for location in np.unique(locations[in_method]):
+                if location != UNKNOWN_LOCATION:
+                    updates[(method, location)] = efficiency[in_method & (locations == location)]
+        for group, values in updates.items():
+            previous = self.samples.get(group)
+            merged = values if previous is None else np.concatenate([previous, values])
+            self.samples[group] = merged[-MAX_GROUP_SAMPLES:]
+
+        self.last_request_id = max(self.last_request_id, int(np.max(request_ids)))
+        self.version = time.strftime('%y%m%d%H%M%S', time.gmtime())
+        self._index(touched=set(updates))
+        return self
+
+    def _group_for(self, method, location):
+        for group in ((method, location), (method, ALL_LOCATIONS)):
+            position = self._positions.get(group)
+            if position is not None and self.count[position] >= MIN_GROUP_SIZE:
+                return position, group[1] != ALL_LOCATIONS
+        return -1, False
+
+    def score(self, methods, locations, efficiency):
+        """Robust z-score and baseline per row.
+
+        Returns arrays z, center (NaN where no baseline exists) and
+        location_specific (False where the method-wide baseline was used).
+        """
+        efficiency = np.asarray(efficiency, dtype=float)
+        unique_methods, method_idx = np.unique(np.asarray(methods, dtype=object), return_inverse=True)
+        unique_locations, location_idx = np.unique(
+            np.array([normalize_location(l) for l in locations], dtype=object), return_inverse=True)
+
+        positions = np.full((len(unique_methods), len(unique_locations)), -1, dtype=np.int64)
+        specific = np.zeros(positions.shape, dtype=bool)
+        for i, method in enumerate(unique_methods):
+            for j, location in enumerate(unique_locations):
+                positions[i, j], specific[i, j] = self._group_for(method, location)
+        rows = positions[method_idx, location_idx]
+        found = rows >= 0
+
+        center = np.full(len(efficiency), np.nan)
+        scale = np.full(len(efficiency), np.nan)
+        center[found] = self.center[rows[found]]
+        scale[found] = self.scale[rows[found]]
+        z = MAD_TO_SIGMA * (efficiency - center) / scale
+        return {'z': z, 'center': center, 'location_specific': specific[method_idx, location_idx]}
+
+def model_path():
+    if has_app_context():
+        return current_app.config.get('ANOMALY_MODEL_PATH', DEFAULT_MODEL_PATH)
+    return os.getenv('ANOMALY_MODEL_PATH', DEFAULT_MODEL_PATH)
+
+_model = None
+_loaded_from = None
+_checked = (None, 0.0)
+_load_lock = threading.Lock()
+
+def get_anomaly_model():
+    """The trained model, None until one has been trained.
+
+    Reloaded when the file changes, so workers pick up a retrained model
+    within RELOAD_CHECK_INTERVAL seconds without a restart.
+    """
+    global _model, _loaded_from, _checked
+    path = model_path()
+    now = time.monotonic()
+    if _checked[0] == path and now - _checked[1] < RELOAD_CHECK_INTERVAL:
+        return _model if _loaded_from is not None and _loaded_from[0] == path else None
+    _checked = (path, now)
+    try:
+        stamp = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        _loaded_from = None
+        return None
+    if stamp != _loaded_from:
+        with _load_lock:
+            if stamp != _loaded_from:
+                try:
+                    _model = ProductionAnomalyModel.from_state(load_artifact(path))
+                except Exception as e:
+                    print(f"Anomaly model at {path} could not be loaded, using fixed thresholds: {e}")
+                    _model = None
+                _loaded_from = stamp
+    return _model
+
+def training_batches(after_id=0, batch_size=TRAINING_BATCH_SIZE):
+    """Column batches of usable VerificationRequest history, oldest first.
+
+    Rejected requests are left out; the robust statistics tolerate the
+    unreviewed fraud that may still be among pending ones.
+    """
+    from app import db
+    from app.models.verification import VerificationRequest
+
+    while True:
+        rows = (db.session.query(VerificationRequest.id, VerificationRequest.production_method,
+                                 VerificationRequest.location, VerificationRequest.energy_source_mwh,
+                                 VerificationRequest.hydrogen_amount)
+                .filter(VerificationRequest.id > after_id,
+                        VerificationRequest.status != 'rejected',
+                        VerificationRequest.energy_source_mwh.isnot(None),
+                        VerificationRequest.hydrogen_amount > 0)
+                .order_by(VerificationRequest.id.asc())
+                .limit(batch_size)
+                .all())
+        if not rows:
+            return
+        ids, methods, locations, energy_mwh, h2_kg = zip(*rows)
+        yield (np.array(ids), methods, locations,
+               np.asarray(energy_mwh, dtype=float) * 1000 / np.asarray(h2_kg, dtype=float))
+        after_id = rows[-1].id
+
+def train(incremental=False, path=None):
+    """Fit from the database and save. Returns (model, records added).
+
+    With ``incremental`` only requests newer than the saved model's last
+    one are read and folded into it.
+    """
+    path = path or model_path()
+    model = None
+    if incremental and os.path.exists(path):
+        model = ProductionAnomalyModel.from_state(load_artifact(path, mmap=False))
+    model = model or ProductionAnomalyModel()
+    added = 0
+    for request_ids, methods, locations, efficiency in training_batches(after_id=model.last_request_id):
+        model.partial_fit(request_ids, methods, locations, efficiency)
+        added += len(request_ids)
+    if added:
+        save_artifact(model.state(), path)
+        _forget_check()
+    return model, added
+
+def _forget_check():
+    # Let this process see a new file on its next call rather than after the interval
+    global _checked
+    _checked = (None, 0.0)
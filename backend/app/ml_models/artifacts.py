@@ -0,0 +1,29 @@
+"""
+On-disk model parameters.
+
+Artifacts are written uncompressed so joblib can memory-map their NumPy
+arrays read-only. When the app is preloaded in the gunicorn master, every
+forked worker then reads the same page-cache pages instead of holding its
+own copy of the arrays. Set ML_ARTIFACT_MMAP=false to load into process
+memory instead, e.g. for artifacts on a filesystem without mmap support.
+"""
+import os
+
+def save_artifact(obj, path):
+    import joblib
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # compress=0: compressed arrays cannot be memory-mapped. Write a new file
+    # and swap it in, since workers may have the old one mapped.
+    temporary = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(obj, temporary, compress=0)
+    os.replace(temporary, path)
+    return path
+
+def load_artifact(path, mmap=None):
+    """Load an artifact, with its arrays memory-mapped read-only by default"""
+    import joblib
+    if mmap is None:
+        mmap = os.getenv('ML_ARTIFACT_MMAP', 'true').lower() == 'true'
+    return joblib.load(path, mmap_mode='r' if mmap else None)
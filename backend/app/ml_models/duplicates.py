@@ -0,0 +1,167 @@
+"""
+Duplicate and near-duplicate production claims.
+
+Each verification request gets a SubmissionFingerprint with its normalized
+claim: a facility key, the production date and the amounts. The facility is
+the normalized location when one is given, so two NGOs claiming the same
+site's output collide; without a location it is the submitting NGO.
+
+Two indexed keys make lookups a handful of index probes instead of a scan:
+
+- exact_hash: facility, date, and amounts rounded to AMOUNT_DECIMALS.
+- bucket: facility, a DATE_WINDOW_DAYS date window, and log-scale cells for
+  both amounts, as wide as the largest log distance NEAR_TOLERANCE allows.
+  Claims within the window and the tolerance are at most one cell apart in
+  each dimension, so probing the 27 neighbouring buckets finds every near
+  duplicate. The candidates are then checked against the real distances.
+
+Only claims that were not rejected count as earlier claims. Two submissions
+committed at the same moment can miss each other, so rescan() rechecks the
+whole history and indexes requests that have no fingerprint yet.
+"""
+import hashlib
+import math
+from collections import namedtuple
+from itertools import product
+from app import db
+from app.models.verification import VerificationRequest, SubmissionFingerprint
+from app.ml_models.anomaly_model import normalize_location, UNKNOWN_LOCATION
+
+AMOUNT_DECIMALS = 3
+DATE_WINDOW_DAYS = 3
+NEAR_TOLERANCE = 0.02  # Relative difference in energy and hydrogen amounts
+# _near() accepts b >= (1 - NEAR_TOLERANCE) * a, a log distance of up to
+# -log(1 - NEAR_TOLERANCE); a hair wider so rounding cannot split such a pair
+_LOG_STEP = -math.log1p(-NEAR_TOLERANCE) * (1 + 1e-9)
+
+ClaimFeatures = namedtuple('ClaimFeatures', 'facility production_date energy_mwh h2_kg')
+
+def claim_features(industry_id, location, production_date, energy_mwh, h2_kg):
+    location = normalize_location(location)
+    facility = f"site:{location}" if location != UNKNOWN_LOCATION else f"ngo:{industry_id}"
+    return ClaimFeatures(facility[:120], production_date,
+                         round(float(energy_mwh or 0), AMOUNT_DECIMALS), round(float(h2_kg), AMOUNT_DECIMALS))
+
+def _digest(*parts):
+    return hashlib.sha256('|'.join(str(p) for p in parts).encode()).hexdigest()
+
+def exact_hash(features):
+    return _digest(features.facility, features.production_date.isoformat(), features.energy_mwh, features.h2_kg)
+
+def _amount_cell(amount):
+    return math.floor(math.log(amount) / _LOG_STEP) if amount > 0 else 'zero'
+
+def _cells(features):
+    return (features.production_date.toordinal() // DATE_WINDOW_DAYS,
+            _amount_cell(features.energy_mwh), _amount_cell(features.h2_kg))
+
+def bucket_key(features, cells=None):
+    return _digest(features.facility, *(cells or _cells(features)))
+
+def neighbour_buckets(features):
+    def around(cell):
+        return (cell,) if cell == 'zero' else (cell - 1, cell, cell + 1)
+    return [bucket_key(features, cells) for cells in product(*map(around, _cells(features)))]
+
+def _near(features, fingerprint):
+    def close(a, b):
+        return abs(a - b) <= NEAR_TOLERANCE * max(abs(a), abs(b))
+    return (abs((features.production_date - fingerprint.production_date).days) < DATE_WINDOW_DAYS
+            and close(features.energy_mwh, fingerprint.energy_mwh)
+            and close(features.h2_kg, fingerprint.h2_kg))
+
+def find_duplicates(features, before_id=None):
+    """Earlier non-rejected claims matching ``features`` as [(request id, 'exact'|'near')].
+
+    Exact matches come first, then near ones; each group oldest first.
+    ``before_id`` limits the search to requests submitted before that one.
+    """
+    digest = exact_hash(features)
+    query = (db.session.query(SubmissionFingerprint)
+             .join(VerificationRequest, VerificationRequest.id == SubmissionFingerprint.verification_request_id)
+             .filter(SubmissionFingerprint.bucket.in_(neighbour_buckets(features)),
+                     VerificationRequest.status != 'rejected'))
+    if before_id is not None:
+        query = query.filter(SubmissionFingerprint.verification_request_id < before_id)
+
+    matches = []
+    for fingerprint in query.all():
+        if fingerprint.exact_hash == digest:
+            matches.append((0, fingerprint.verification_request_id, 'exact'))
+        elif _near(features, fingerprint):
+            matches.append((1, fingerprint.verification_request_id, 'near'))
+    return [(request_id, kind) for _, request_id, kind in sorted(matches)]
+
+def index_claim(verification_request_id, features, duplicates):
+    """Add the fingerprint for a request to the session (caller commits)"""
+    fingerprint = SubmissionFingerprint(
+        verification_request_id=verification_request_id,
+        facility=features.facility,
+        production_date=features.production_date,
+        energy_mwh=features.energy_mwh,
+        h2_kg=features.h2_kg,
+        exact_hash=exact_hash(features),
+        bucket=bucket_key(features),
+        duplicate_of=duplicates[0][0] if duplicates else None,
+        match=duplicates[0][1] if duplicates else None,
+    )
+    db.session.add(fingerprint)
+    return fingerprint
+
+def duplicate_summary(duplicates):
+    return {
+        "flagged": bool(duplicates),
+        "exact": [request_id for request_id, kind in duplicates if kind == 'exact'],
+        "near": [request_id for request_id, kind in duplicates if kind == 'near'],
+    }
+
+def load_flags(request_ids):
+    """Map request id -> (duplicate_of, match) for flagged requests, in one query"""
+    if not request_ids:
+        return {}
+    rows = (db.session.query(SubmissionFingerprint.verification_request_id,
+                             SubmissionFingerprint.duplicate_of, SubmissionFingerprint.match)
+            .filter(SubmissionFingerprint.verification_request_id.in_(request_ids),
+                    SubmissionFingerprint.match.isnot(None))
+            .all())
+    return {request_id: (duplicate_of, match) for request_id, duplicate_of, match in rows}
+
+def _features_of(verification):
+    return claim_features(verification.industry_id, verification.location, verification.production_date,
+                          verification.energy_source_mwh, verification.hydrogen_amount)
+
+def rescan(batch_size=500):
+    """Index requests without a fingerprint and recheck every claim against earlier ones.
+
+    Returns counts of indexed, exact and near requests. Requests are walked in
+    id order, so each is only compared with claims submitted before it.
+    Existing fingerprints get their keys recomputed, so run it after the
+    hashing or bucketing changes.
+    """
+    counts = {'indexed': 0, 'exact': 0, 'near': 0}
+    last_id = 0
+    while True:
+        batch = (db.session.query(VerificationRequest, SubmissionFingerprint)
+                 .outerjoin(SubmissionFingerprint,
+                            SubmissionFingerprint.verification_request_id == VerificationRequest.id)
+                 .filter(VerificationRequest.id > last_id)
+                 .order_by(VerificationRequest.id.asc())
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            return counts
+        for verification, fingerprint in batch:
+            features = _features_of(verification)
+            duplicates = find_duplicates(features, before_id=verification.id)
+            if fingerprint is None:
+                fingerprint = index_claim(verification.id, features, duplicates)
+                counts['indexed'] += 1
+            else:
+                fingerprint.exact_hash = exact_hash(features)
+                fingerprint.bucket = bucket_key(features)
+                fingerprint.duplicate_of = duplicates[0][0] if duplicates else None
+                fingerprint.match = duplicates[0][1] if duplicates else None
+            if fingerprint.match:
+                counts[fingerprint.match] += 1
+        db.session.commit()
+        last_id = batch[-1][0].id
@@ -1,32 +1,100 @@
 import numpy as np
-import pandas as pd
-import joblib
 import os
+import random
+import sys
+import threading
+from collections import namedtuple
 from datetime import datetime, timedelta
+from functools import lru_cache
 import hashlib
 import json
 from typing import Dict, List, Tuple, Optional
+from app.ml_models.anomaly_model import Z_THRESHOLD, get_anomaly_model
 import warnings
 warnings.filterwarnings('ignore')
 
+# Per-method constants, compiled once from efficiency_ranges / energy_constraints.
+# efficiency_range and energy_range are the source dicts, reported as-is in results.
+MethodParams = namedtuple('MethodParams', 'eff_min eff_max eff_opt eff_span energy_min energy_max '
+                                          'efficiency_range energy_range')
+
+COMPOSITE_WEIGHTS = {
+    'efficiency': 0.3,
+    'production': 0.25,
+    'energy': 0.2,
+    'anomaly': 0.15,
+    'pattern': 0.1
+}
+
+MITIGATIONS = {
+    'low_efficiency': 'Implement efficiency optimization measures',
+    'suspicious_production': 'Verify production data with additional sources',
+    'high_anomalies': 'Conduct detailed investigation of anomalies',
+    'unknown_location': 'Verify facility location and ownership',
+    'equipment_mismatch': 'Verify equipment specifications and capacity'
+}
+
+SEASONS = {12: 'winter', 1: 'winter', 2: 'winter', 3: 'spring', 4: 'spring', 5: 'spring',
+           6: 'summer', 7: 'summer', 8: 'summer', 9: 'autumn', 10: 'autumn', 11: 'autumn'}
+
+def parse_timestamp(timestamp) -> Optional[datetime]:
+    """Parse an ISO timestamp, None if it is not one"""
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+@lru_cache(maxsize=4096)
+def _timestamp_features(timestamp: str) -> Tuple[str, bool]:
+    dt = parse_timestamp(timestamp)
+    if dt is None:
+        return 'unknown', False
+    return SEASONS[dt.month], dt.hour < 6 or dt.hour > 22
+
+def timestamp_features(timestamp) -> Tuple[str, bool]:
+    """(season, outside production hours) for a timestamp, parsed once per distinct value"""
+    if not isinstance(timestamp, str):
+        return 'unknown', False
+    return _timestamp_features(timestamp)
+
 class AdvancedH2VerificationModel:
     def __init__(self):
         print("🚀 Advanced H₂ Verification ML Model Initialized!")
-        self.model_version = "2.0.0"
+        self.base_version = "2.0.0"
         self.confidence_threshold = 0.85
         self.fraud_threshold = 0.7
         
         # Initialize model parameters
         self.efficiency_ranges = {
+            'electrolysis': {'min': 45, 'max': 60, 'optimal': 52.5},
             'wind': {'min': 40, 'max': 55, 'optimal': 47.5}
         }
         
+        # Method-specific energy input constraints (MWh)
+        self.energy_constraints = {
+            'electrolysis': {'min': 0.5, 'max': 500, 'typical': 25},
+            'wind': {'min': 0.5, 'max': 500, 'typical': 25}
+        }
+        
         # Historical data patterns for anomaly detection
         self.historical_patterns = self._initialize_historical_patterns()
         
         # Fraud detection patterns
         self.fraud_patterns = self._initialize_fraud_patterns()
         
+        self.method_params = self._compile_method_params()
+        
+    def _compile_method_params(self) -> Dict[str, MethodParams]:
+        """Per-method lookup table; rebuild it after changing the range dicts"""
+        params = {}
+        for method, ranges in self.efficiency_ranges.items():
+            constraints = self.energy_constraints.get(method, self.energy_constraints['electrolysis'])
+            params[method] = MethodParams(
+                ranges['min'], ranges['max'], ranges['optimal'], ranges['max'] - ranges['min'],
+                constraints['min'], constraints['max'], ranges, constraints
+            )
+        return params
+    
     def _initialize_historical_patterns(self) -> Dict:
         """Initialize historical production patterns"""
         return {
@@ -51,6 +119,30 @@ class AdvancedH2VerificationModel:
             'equipment_mismatch': 0.9
         }
     
+    @property
+    def model_version(self) -> str:
+        return self._version(get_anomaly_model())
+    
+    def _version(self, anomaly_model) -> str:
+        # Scores depend on the trained baselines, so a retrain is a new version.
+        # Stored in VerificationMLResult.model_version, which holds 20 characters.
+        if anomaly_model is None:
+            return self.base_version
+        return f"{self.base_version}+a{anomaly_model.version}"
+    
+    def _baseline(self, anomaly_model, method, location, efficiency) -> Optional[Dict]:
+        """Learned baseline for one record, None without a trained group"""
+        if anomaly_model is None:
+            return None
+        scored = anomaly_model.score([method], [location], [efficiency])
+        if np.isnan(scored['center'][0]):
+            return None
+        return {
+            'z': float(scored['z'][0]),
+            'center': float(scored['center'][0]),
+            'location_specific': bool(scored['location_specific'][0]),
+        }
+    
     def verify_h2_production(self, 
                            energy_mwh: float, 
                            h2_kg: float, 
@@ -67,11 +159,14 @@ class AdvancedH2VerificationModel:
         
         # Basic efficiency calculation
         efficiency_kwh_per_kg = (energy_mwh * 1000) / h2_kg
+        params = self.method_params[production_method]
+        anomaly_model = get_anomaly_model()
+        baseline = self._baseline(anomaly_model, production_method, location, efficiency_kwh_per_kg)
         
         # Multi-algorithm validation
         validation_results = self._run_validation_algorithms(
             energy_mwh, h2_kg, efficiency_kwh_per_kg, production_method,
-            location, timestamp, equipment_specs, weather_data, historical_data
+            location, timestamp, equipment_specs, weather_data, historical_data, baseline, params
         )
         
         # Calculate composite scores
@@ -79,10 +174,11 @@ class AdvancedH2VerificationModel:
         fraud_probability = self._calculate_fraud_probability(validation_results)
         confidence_level = self._calculate_confidence_level(validation_results)
         
+        now = datetime.now().isoformat()
         return {
-            'verification_id': self._generate_verification_id(),
-            'timestamp': datetime.now().isoformat(),
-            'model_version': self.model_version,
+            'verification_id': self._generate_verification_id(now),
+            'timestamp': now,
+            'model_version': self._version(anomaly_model),
             
             # Core results
             'is_valid': composite_score >= self.confidence_threshold,
@@ -93,7 +189,7 @@ class AdvancedH2VerificationModel:
             # Efficiency metrics
             'calculated_efficiency': float(efficiency_kwh_per_kg),
             'efficiency_score': float(validation_results['efficiency_validation']['score']),
-            'efficiency_rating': self._get_efficiency_rating(efficiency_kwh_per_kg, production_method),
+            'efficiency_rating': self._get_efficiency_rating(efficiency_kwh_per_kg, params),
             
             # Production validation
             'production_validation': validation_results['production_validation'],
@@ -115,37 +211,194 @@ class AdvancedH2VerificationModel:
             'next_steps': self._generate_next_steps(validation_results, composite_score)
         }
     
+    def verify_batch(self, data) -> Dict[str, np.ndarray]:
+        """
+        Vectorized counterpart of verify_h2_production for whole production histories.
+        
+        ``data`` is a pandas DataFrame or a mapping of equal-length columns:
+        energy_mwh, h2_kg and optionally method (or production_method), timestamp
+        and location. Returns a dict of arrays, one entry per input row, whose scores
+        match the scalar path row for row (without equipment, weather or history input).
+        """
+        energy_mwh, h2_kg, methods, timestamps, locations = self._batch_columns(data)
+        n = len(energy_mwh)
+        anomaly_model = get_anomaly_model()
+        
+        unsupported = sorted(set(methods) - set(self.method_params))
+        if unsupported:
+            raise ValueError(f"Unsupported production method(s): {', '.join(unsupported)}")
+        if np.any(h2_kg == 0):
+            raise ValueError("h2_kg must be non-zero")
+        
+        # Per-row method parameters
+        unique_methods, method_idx = np.unique(methods, return_inverse=True)
+        table = np.array([self.method_params[m][:6] for m in unique_methods], dtype=float)[method_idx]
+        eff_min, eff_max, eff_opt, _, energy_min, energy_max = table.T
+        
+        # Per-row timestamp features, each distinct timestamp parsed once
+        unique_ts, ts_idx = np.unique(timestamps, return_inverse=True)
+        features = [timestamp_features(ts) for ts in unique_ts]
+        seasonal_factor = np.array([
+            self.historical_patterns['seasonal_factors'].get(season, 1.0) if ts else 1.0
+            for ts, (season, _) in zip(unique_ts, features)
+        ])[ts_idx]
+        time_anomaly = np.array([off_hours for _, off_hours in features], dtype=bool)[ts_idx]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            efficiency = (energy_mwh * 1000) / h2_kg
+            
+            # 1. Efficiency
+            in_range = (eff_min <= efficiency) & (efficiency <= eff_max)
+            efficiency_score = np.where(in_range, 1.0 - np.abs(efficiency - eff_opt) / (eff_max - eff_min), 0.1)
+            efficiency_score = np.maximum(0.1, np.minimum(1.0, efficiency_score))
+            
+            # 2. Production volume
+            expected_min = energy_mwh * 1000 / eff_max
+            expected_max = energy_mwh * 1000 / eff_min
+            deviation = np.minimum(np.abs(h2_kg - expected_min), np.abs(h2_kg - expected_max))
+            production_score = np.where(
+                (expected_min <= h2_kg) & (h2_kg <= expected_max),
+                1.0,
+                np.maximum(0.1, 1.0 - (deviation / expected_min))
+            )
+            
+            # 3. Energy input
+            energy_score = np.where((energy_min <= energy_mwh) & (energy_mwh <= energy_max), 1.0, 0.1)
+            
+            # 4. Anomalies, against the trained baseline where one exists
+            if anomaly_model is not None:
+                baseline = anomaly_model.score(methods, locations, efficiency)
+            else:
+                baseline = {'z': np.full(n, np.nan), 'center': np.full(n, np.nan)}
+            learned = ~np.isnan(baseline['center'])
+            low_efficiency = np.where(learned, baseline['z'] < -Z_THRESHOLD, efficiency < eff_min * 0.8)
+            high_efficiency = np.where(learned, baseline['z'] > Z_THRESHOLD, efficiency > eff_max * 1.2)
+            expected_h2 = energy_mwh * 1000 / np.where(learned, baseline['center'], eff_opt)
+            unusual_volume = np.abs(h2_kg - expected_h2) / expected_h2 > 0.5
+            consistency = np.maximum(0.1, 1.0 - np.abs(efficiency - baseline['center']) / baseline['center'])
+        
+        anomaly_raw = (0.0 + np.where(low_efficiency, 0.3, 0.0) + np.where(high_efficiency, 0.3, 0.0)
+                       + np.where(unusual_volume, 0.2, 0.0) + np.where(time_anomaly, 0.2, 0.0))
+        anomaly_score = np.minimum(1.0, anomaly_raw)
+        anomaly_count = (low_efficiency.astype(int) + high_efficiency + unusual_volume + time_anomaly)
+        
+        # 5. Patterns: consistency with the trained baseline (no per-row history in batch mode)
+        pattern_score = np.where(learned, consistency, 1.0)
+        
+        # 6. Risk
+        risk_score = (0.0 + np.where(efficiency_score < 0.7, 0.3, 0.0) + np.where(production_score < 0.7, 0.3, 0.0)
+                      + np.where(anomaly_score > 0.5, 0.4, 0.0) + np.where(locations == 'unknown', 0.1, 0.0))
+        risk_level = np.where(risk_score < 0.3, 'low', np.where(risk_score < 0.6, 'medium', 'high'))
+        
+        # Composite, fraud and confidence (same weights and operation order as the scalar path)
+        composite_score = (
+            efficiency_score * 0.3 +
+            production_score * 0.25 +
+            energy_score * 0.2 +
+            (1.0 - anomaly_score) * 0.15 +
+            pattern_score * 0.1
+        )
+        composite_score = np.maximum(0.0, np.minimum(1.0, composite_score))
+        fraud_probability = np.minimum(1.0, 0.0 + np.where(efficiency_score < 0.5, 0.3, 0.0)
+                                       + np.where(production_score < 0.5, 0.3, 0.0) + anomaly_score * 0.4)
+        confidence_level = 0.8 * np.where(anomaly_score > 0.5, 0.7, 1.0) * np.where(efficiency_score < 0.7, 0.8, 1.0)
+        confidence_level = np.maximum(0.1, np.minimum(1.0, confidence_level))
+        
+        relative_deviation = np.abs(efficiency - eff_opt) / eff_opt
+        efficiency_rating = np.select(
+            [relative_deviation < 0.1, relative_deviation < 0.2, relative_deviation < 0.3],
+            ['excellent', 'good', 'acceptable'],
+            default='poor'
+        )
+        
+        return {
+            'model_version': self._version(anomaly_model),
+            'is_valid': composite_score >= self.confidence_threshold,
+            'composite_score': composite_score,
+            'fraud_probability': fraud_probability,
+            'confidence_level': confidence_level,
+            'calculated_efficiency': efficiency,
+            'efficiency_score': efficiency_score,
+            'efficiency_rating': efficiency_rating,
+            'production_score': production_score,
+            'energy_score': energy_score,
+            'anomaly_score': anomaly_score,
+            'anomaly_count': anomaly_count,
+            'anomaly_severity': np.where(anomaly_raw > 0.5, 'high', np.where(anomaly_raw > 0.2, 'medium', 'low')),
+            'pattern_score': pattern_score,
+            'robust_z': np.where(learned, baseline['z'], None),
+            'seasonal_adjustment': seasonal_factor,
+            'risk_score': risk_score,
+            'risk_level': risk_level,
+        }
+    
+    def _batch_columns(self, data) -> Tuple[np.ndarray, ...]:
+        """Normalize DataFrame / mapping input into typed column arrays"""
+        # A caller can only pass a DataFrame if pandas is already imported
+        pd = sys.modules.get('pandas')
+        if pd is not None and isinstance(data, pd.DataFrame):
+            data = {column: data[column].to_numpy() for column in data.columns}
+        
+        energy_mwh = np.asarray(data['energy_mwh'], dtype=float)
+        h2_kg = np.asarray(data['h2_kg'], dtype=float)
+        n = len(energy_mwh)
+        if len(h2_kg) != n:
+            raise ValueError("energy_mwh and h2_kg must have the same length")
+        # Missing amounts arrive as NaN and would score as NaN
+        missing = np.flatnonzero(~(np.isfinite(energy_mwh) & np.isfinite(h2_kg)))
+        if len(missing):
+            rows = ', '.join(str(i) for i in missing[:10])
+            raise ValueError(f"energy_mwh and h2_kg must be finite numbers (rows {rows})")
+        
+        def text_column(values, default):
+            if values is None:
+                return np.full(n, default, dtype=object)
+            column = np.array([default if v is None else str(v) for v in values], dtype=object)
+            if len(column) != n:
+                raise ValueError("All batch columns must have the same length")
+            return column
+        
+        methods = text_column(data.get('method', data.get('production_method')), 'electrolysis')
+        timestamps = text_column(data.get('timestamp'), '')
+        locations = text_column(data.get('location'), 'unknown')
+        return energy_mwh, h2_kg, methods, timestamps, locations
+    
     def _run_validation_algorithms(self, energy_mwh, h2_kg, efficiency, method, 
-                                  location, timestamp, equipment, weather, historical):
+                                  location, timestamp, equipment, weather, historical, baseline=None, params=None):
         """Run multiple validation algorithms"""
         results = {}
+        if params is None:
+            params = self.method_params[method]
         
         # 1. Efficiency Validation
-        results['efficiency_validation'] = self._validate_efficiency(efficiency, method)
+        results['efficiency_validation'] = self._validate_efficiency(efficiency, params)
         
         # 2. Production Volume Validation
-        results['production_validation'] = self._validate_production_volume(energy_mwh, h2_kg, method)
+        results['production_validation'] = self._validate_production_volume(energy_mwh, h2_kg, params)
         
         # 3. Energy Input Validation
-        results['energy_validation'] = self._validate_energy_input(energy_mwh, method, equipment)
+        results['energy_validation'] = self._validate_energy_input(energy_mwh, params, equipment)
         
         # 4. Anomaly Detection
-        results['anomaly_detection'] = self._detect_anomalies(energy_mwh, h2_kg, efficiency, method, location, timestamp)
+        results['anomaly_detection'] = self._detect_anomalies(energy_mwh, h2_kg, efficiency, params, location, timestamp,
+                                                              baseline)
         
         # 5. Pattern Analysis
-        results['pattern_analysis'] = self._analyze_patterns(energy_mwh, h2_kg, method, location, timestamp, weather, historical)
+        results['pattern_analysis'] = self._analyze_patterns(energy_mwh, h2_kg, method, location, timestamp, weather, historical,
+                                                             baseline)
         
         # 6. Risk Assessment
         results['risk_assessment'] = self._assess_risk(results, location, method)
         
         return results
     
-    def _validate_efficiency(self, efficiency: float, method: str) -> Dict:
+    def _validate_efficiency(self, efficiency: float, params: MethodParams) -> Dict:
         """Validate efficiency against known ranges"""
-        ranges = self.efficiency_ranges.get(method, self.efficiency_ranges['electrolysis'])
+        deviation = abs(efficiency - params.eff_opt)
+        within_range = params.eff_min <= efficiency <= params.eff_max
         
-        if ranges['min'] <= efficiency <= ranges['max']:
-            score = 1.0 - abs(efficiency - ranges['optimal']) / (ranges['max'] - ranges['min'])
+        if within_range:
+            score = 1.0 - deviation / params.eff_span
             rating = 'excellent' if score > 0.9 else 'good' if score > 0.7 else 'acceptable'
         else:
             score = 0.1
@@ -154,16 +407,17 @@ class AdvancedH2VerificationModel:
         return {
             'score': max(0.1, min(1.0, score)),
             'rating': rating,
-            'expected_range': ranges,
-            'deviation': abs(efficiency - ranges['optimal']),
-            'is_within_range': ranges['min'] <= efficiency <= ranges['max']
+            'expected_range': params.efficiency_range,
+            'deviation': deviation,
+            'is_within_range': within_range
         }
     
-    def _validate_production_volume(self, energy_mwh: float, h2_kg: float, method: str) -> Dict:
+    def _validate_production_volume(self, energy_mwh: float, h2_kg: float, params: MethodParams) -> Dict:
         """Validate production volume against energy input"""
-        expected_min = energy_mwh * 1000 / self.efficiency_ranges[method]['max']
-        expected_max = energy_mwh * 1000 / self.efficiency_ranges[method]['min']
+        expected_min = energy_mwh * 1000 / params.eff_max
+        expected_max = energy_mwh * 1000 / params.eff_min
         
+        midpoint = (expected_min + expected_max) / 2
         if expected_min <= h2_kg <= expected_max:
             score = 1.0
             rating = 'normal'
@@ -177,19 +431,14 @@ class AdvancedH2VerificationModel:
             'rating': rating,
             'expected_range': {'min': expected_min, 'max': expected_max},
             'actual_production': h2_kg,
-            'deviation_percentage': abs(h2_kg - (expected_min + expected_max) / 2) / ((expected_min + expected_max) / 2) * 100
+            'deviation_percentage': abs(h2_kg - midpoint) / midpoint * 100
         }
     
-    def _validate_energy_input(self, energy_mwh: float, method: str, equipment: Dict = None) -> Dict:
+    def _validate_energy_input(self, energy_mwh: float, params: MethodParams, equipment: Dict = None) -> Dict:
         """Validate energy input against method and equipment constraints"""
-        # Method-specific energy constraints
-        method_constraints = {
-            'wind': {'min': 0.5, 'max': 500, 'typical': 25}
-        }
-        
-        constraints = method_constraints.get(method, method_constraints['electrolysis'])
+        within_constraints = params.energy_min <= energy_mwh <= params.energy_max
         
-        if constraints['min'] <= energy_mwh <= constraints['max']:
+        if within_constraints:
             score = 1.0
             rating = 'normal'
         else:
@@ -199,27 +448,39 @@ class AdvancedH2VerificationModel:
         return {
             'score': score,
             'rating': rating,
-            'constraints': constraints,
-            'is_within_constraints': constraints['min'] <= energy_mwh <= constraints['max'],
-            'equipment_compatibility': self._check_equipment_compatibility(energy_mwh, method, equipment)
+            'constraints': params.energy_range,
+            'is_within_constraints': within_constraints,
+            'equipment_compatibility': self._check_equipment_compatibility(energy_mwh, equipment)
         }
     
-    def _detect_anomalies(self, energy_mwh, h2_kg, efficiency, method, location, timestamp) -> Dict:
-        """Detect anomalies using statistical methods"""
+    def _detect_anomalies(self, energy_mwh, h2_kg, efficiency, params, location, timestamp, baseline=None) -> Dict:
+        """Detect anomalies using statistical methods
+        
+        With a trained baseline for the method and location, efficiency outliers are
+        robust z-scores beyond Z_THRESHOLD and the expected volume follows the
+        baseline median; otherwise fixed thresholds around the method's range apply.
+        """
         anomalies = []
         anomaly_score = 0.0
         
-        # Statistical outlier detection (simplified)
-        if efficiency < self.efficiency_ranges[method]['min'] * 0.8:
+        if baseline is not None:
+            low_efficiency = baseline['z'] < -Z_THRESHOLD
+            high_efficiency = baseline['z'] > Z_THRESHOLD
+            expected_h2 = energy_mwh * 1000 / baseline['center']
+        else:
+            low_efficiency = efficiency < params.eff_min * 0.8
+            high_efficiency = efficiency > params.eff_max * 1.2
+            expected_h2 = energy_mwh * 1000 / params.eff_opt
+        
+        if low_efficiency:
             anomalies.append('extremely_low_efficiency')
             anomaly_score += 0.3
         
-        if efficiency > self.efficiency_ranges[method]['max'] * 1.2:
+        if high_efficiency:
             anomalies.append('extremely_high_efficiency')
             anomaly_score += 0.3
         
         # Production volume anomaly
-        expected_h2 = energy_mwh * 1000 / self.efficiency_ranges[method]['optimal']
         if abs(h2_kg - expected_h2) / expected_h2 > 0.5:
             anomalies.append('unusual_production_volume')
             anomaly_score += 0.2
@@ -235,10 +496,12 @@ class AdvancedH2VerificationModel:
             'detected_anomalies': anomalies,
             'anomaly_score': min(1.0, anomaly_score),
             'anomaly_count': len(anomalies),
-            'severity': 'high' if anomaly_score > 0.5 else 'medium' if anomaly_score > 0.2 else 'low'
+            'severity': 'high' if anomaly_score > 0.5 else 'medium' if anomaly_score > 0.2 else 'low',
+            'robust_z': baseline['z'] if baseline is not None else None,
+            'baseline': ('location' if baseline['location_specific'] else 'method') if baseline is not None else 'fixed'
         }
     
-    def _analyze_patterns(self, energy_mwh, h2_kg, method, location, timestamp, weather, historical) -> Dict:
+    def _analyze_patterns(self, energy_mwh, h2_kg, method, location, timestamp, weather, historical, baseline=None) -> Dict:
         """Analyze production patterns for consistency"""
         pattern_score = 1.0
         patterns = []
@@ -258,8 +521,8 @@ class AdvancedH2VerificationModel:
             patterns.append(f'weather_impact:{weather_factor}')
         
         # Historical consistency
-        if historical:
-            consistency = self._check_historical_consistency(energy_mwh, h2_kg, method, historical)
+        if historical or baseline is not None:
+            consistency = self._check_historical_consistency(energy_mwh, h2_kg, method, historical, baseline)
             pattern_score *= consistency
             patterns.append(f'historical_consistency:{consistency}')
         
@@ -307,14 +570,7 @@ class AdvancedH2VerificationModel:
     
     def _calculate_composite_score(self, validation_results: Dict) -> float:
         """Calculate composite validation score"""
-        weights = {
-            'efficiency': 0.3,
-            'production': 0.25,
-            'energy': 0.2,
-            'anomaly': 0.15,
-            'pattern': 0.1
-        }
-        
+        weights = COMPOSITE_WEIGHTS
         composite = (
             validation_results['efficiency_validation']['score'] * weights['efficiency'] +
             validation_results['production_validation']['score'] * weights['production'] +
@@ -356,16 +612,15 @@ class AdvancedH2VerificationModel:
         
         return max(0.1, min(1.0, base_confidence))
     
-    def _get_efficiency_rating(self, efficiency: float, method: str) -> str:
+    def _get_efficiency_rating(self, efficiency: float, params: MethodParams) -> str:
         """Get efficiency rating based on method and value"""
-        ranges = self.efficiency_ranges.get(method, self.efficiency_ranges['electrolysis'])
-        optimal = ranges['optimal']
+        relative_deviation = abs(efficiency - params.eff_opt) / params.eff_opt
         
-        if abs(efficiency - optimal) / optimal < 0.1:
+        if relative_deviation < 0.1:
             return 'excellent'
-        elif abs(efficiency - optimal) / optimal < 0.2:
+        elif relative_deviation < 0.2:
             return 'good'
-        elif abs(efficiency - optimal) / optimal < 0.3:
+        elif relative_deviation < 0.3:
             return 'acceptable'
         else:
             return 'poor'
@@ -397,43 +652,20 @@ class AdvancedH2VerificationModel:
         else:
             return ["Reject application", "Request comprehensive audit", "Investigate potential fraud"]
     
-    def _generate_verification_id(self) -> str:
+    def _generate_verification_id(self, now: str = None) -> str:
         """Generate unique verification ID"""
-        timestamp = datetime.now().isoformat()
-        random_component = np.random.randint(1000, 9999)
-        return f"VER_{timestamp[:10]}_{random_component}"
+        timestamp = now or datetime.now().isoformat()
+        return f"VER_{timestamp[:10]}_{random.randrange(1000, 9999)}"
     
     def _get_season(self, timestamp: str) -> str:
         """Get season from timestamp"""
-        try:
-            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            month = dt.month
-            if month in [3, 4, 5]:
-                return 'spring'
-            elif month in [6, 7, 8]:
-                return 'summer'
-            elif month in [9, 10, 11]:
-                return 'autumn'
-            else:
-                return 'winter'
-        except:
-            return 'unknown'
+        return timestamp_features(timestamp)[0]
     
     def _detect_time_anomaly(self, timestamp: str) -> bool:
-        """Detect time-based anomalies"""
-        try:
-            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            hour = dt.hour
-            
-            # Flag unusual production hours
-            if hour < 6 or hour > 22:
-                return True
-            
-            return False
-        except:
-            return False
+        """Flag production outside 06:00-22:59"""
+        return timestamp_features(timestamp)[1]
     
-    def _check_equipment_compatibility(self, energy_mwh: float, method: str, equipment: Dict = None) -> bool:
+    def _check_equipment_compatibility(self, energy_mwh: float, equipment: Dict = None) -> bool:
         """Check if equipment is compatible with energy input"""
         if not equipment:
             return True  # Assume compatible if no equipment data
@@ -442,8 +674,14 @@ class AdvancedH2VerificationModel:
         max_capacity = equipment.get('max_capacity_mwh', float('inf'))
         return energy_mwh <= max_capacity
     
-    def _check_historical_consistency(self, energy_mwh: float, h2_kg: float, method: str, historical: List[Dict]) -> float:
-        """Check consistency with historical data"""
+    def _check_historical_consistency(self, energy_mwh: float, h2_kg: float, method: str, historical: List[Dict],
+                                      baseline: Dict = None) -> float:
+        """Check consistency with the trained baseline, or else with records sent by the caller"""
+        if baseline is not None:
+            current_efficiency = (energy_mwh * 1000) / h2_kg
+            deviation = abs(current_efficiency - baseline['center']) / baseline['center']
+            return max(0.1, 1.0 - deviation)
+        
         if not historical or len(historical) < 3:
             return 1.0  # Assume consistent if insufficient data
         
@@ -468,15 +706,23 @@ class AdvancedH2VerificationModel:
     
     def _suggest_mitigation(self, risk_factors: List[str]) -> List[str]:
         """Suggest mitigation strategies for identified risks"""
-        mitigation_map = {
-            'low_efficiency': 'Implement efficiency optimization measures',
-            'suspicious_production': 'Verify production data with additional sources',
-            'high_anomalies': 'Conduct detailed investigation of anomalies',
-            'unknown_location': 'Verify facility location and ownership',
-            'equipment_mismatch': 'Verify equipment specifications and capacity'
-        }
-        
-        return [mitigation_map.get(factor, 'Review and validate data') for factor in risk_factors]
+        return [MITIGATIONS.get(factor, 'Review and validate data') for factor in risk_factors]
+
+# Shared model instance, built on first use rather than at import so workers
+# that never verify anything do not pay for it
+_model = None
+_model_lock = threading.Lock()
+
+def get_h2_model() -> AdvancedH2VerificationModel:
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = AdvancedH2VerificationModel()
+    return _model
 
-# Global model instance
-advanced_h2_model = AdvancedH2VerificationModel()
+def __getattr__(name):
+    # Keeps ``from h2_verification_model import advanced_h2_model`` working
+    if name == 'advanced_h2_model':
+        return get_h2_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
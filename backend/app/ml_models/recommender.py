@@ -0,0 +1,195 @@
+"""
+Credit recommendations for buyers.
+
+Features of every active listing (price per kg, production method, creator
+reputation from audit scores) are loaded in one query into an in-memory index
+of NumPy arrays. Each buyer's ranking is a single vectorized pass over the
+index, weighted by the buyer's purchase history. The index remembers the
+'credits' change version it was built at and is rebuilt lazily once the
+version has moved on, whichever worker made the change. Production methods
+are not versioned, so RECOMMENDATION_INDEX_TTL bounds how long those stay old.
+"""
+import threading
+import time
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.models.credit import Credit
+from app.models.request import Request
+from app.models.transaction import PurchasedCredit
+from app.models.user import User
+from app.models.verification import VerificationRequest
+from app.utilis.versioning import current_version
+
+UNKNOWN_METHOD = 'unknown'
+DEFAULT_REPUTATION = 0.5  # Creators without audited requests
+REASONS = ("Best value", "Trusted producer", "Matches your production methods", "Fits your price range")
+# Weights for value, reputation, method affinity, price fit; cold-start buyers
+# have no method or price preference and are ranked on the first two only
+WEIGHTS = np.array([0.35, 0.25, 0.25, 0.15])
+COLD_START_WEIGHTS = np.array([0.55, 0.45, 0.0, 0.0])
+FAMILIAR_CREATOR_BONUS = 0.05
+
+class RecommendationIndex:
+    def __init__(self, rows, built_at, version=0):
+        self.built_at = built_at
+        self.version = version
+        self.credit_ids = np.array([r.id for r in rows], dtype=np.int64)
+        self.creator_ids = np.array([r.creator_id for r in rows], dtype=np.int64)
+        prices = np.array([r.price for r in rows], dtype=float)
+        amounts = np.array([r.amount for r in rows], dtype=float)
+        self.price_per_kg = prices / np.maximum(amounts, 1.0)
+
+        self.methods = sorted({r.method or UNKNOWN_METHOD for r in rows})
+        method_codes = {m: i for i, m in enumerate(self.methods)}
+        self.method_codes = np.array([method_codes[r.method or UNKNOWN_METHOD] for r in rows], dtype=np.int64)
+
+        reputation = np.array([r.reputation if r.reputation is not None else np.nan for r in rows], dtype=float)
+        known = ~np.isnan(reputation)
+        if known.any():
+            low, high = reputation[known].min(), reputation[known].max()
+            reputation[known] = (reputation[known] - low) / (high - low) if high > low else 1.0
+        reputation[~known] = DEFAULT_REPUTATION
+        self.reputation = reputation
+
+        if len(rows):
+            low, high = self.price_per_kg.min(), self.price_per_kg.max()
+            self.value = (high - self.price_per_kg) / (high - low) if high > low else np.ones(len(rows))
+        else:
+            self.value = np.zeros(0)
+
+        self.listings = {r.id: {
+            "id": r.id,
+            "name": r.name,
+            "amount": r.amount,
+            "price": r.price,
+            "creator": {
+                "id": r.creator_id,
+                "username": r.username,
+                "email": r.email
+            } if r.username is not None else None
+        } for r in rows}
+
+    def __len__(self):
+        return len(self.credit_ids)
+
+    def rank(self, preferences, limit):
+        """Top ``limit`` listings for a buyer as (credit id, score 0-100, reason)"""
+        if not len(self):
+            return []
+
+        method_share = np.zeros(len(self.methods))
+        for method, share in preferences['methods'].items():
+            if method in self.methods:
+                method_share[self.methods.index(method)] = share
+        affinity = method_share[self.method_codes]
+
+        if preferences['price_per_kg']:
+            # 1 at the buyer's usual price per kg, halving per doubling away from it
+            with np.errstate(divide='ignore'):
+                distance = np.abs(np.log2(self.price_per_kg / preferences['price_per_kg']))
+            price_fit = 1.0 / (1.0 + distance)
+            weights = WEIGHTS
+        else:
+            price_fit = np.zeros(len(self))
+            weights = COLD_START_WEIGHTS
+
+        features = np.column_stack([self.value, self.reputation, affinity, price_fit])
+        contributions = features * weights
+        scores = contributions.sum(axis=1)
+        scores += FAMILIAR_CREATOR_BONUS * np.isin(self.creator_ids, preferences['creators'])
+        scores[np.isin(self.credit_ids, preferences['held'])] = -np.inf
+
+        available = int(np.isfinite(scores).sum())
+        limit = min(limit, available)
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.lexsort((self.credit_ids[top], -scores[top]))]
+        reasons = contributions[top].argmax(axis=1)
+        return [(int(self.credit_ids[i]), round(float(min(scores[i], 1.0) * 100), 1), REASONS[reason])
+                for i, reason in zip(top, reasons)]
+
+_index = None
+_refresh_lock = threading.Lock()
+
+def _credit_methods():
+    """Latest production method per credit from its verification request"""
+    latest = (
+        db.session.query(VerificationRequest.credit_id, func.max(VerificationRequest.id).label('request_id'))
+        .filter(VerificationRequest.credit_id.isnot(None))
+        .group_by(VerificationRequest.credit_id)
+        .subquery()
+    )
+    return (
+        db.session.query(latest.c.credit_id, VerificationRequest.production_method.label('method'))
+        .join(VerificationRequest, VerificationRequest.id == latest.c.request_id)
+        .subquery()
+    )
+
+def build_index():
+    # Version first: the index is then at least as new as the version it reports
+    version = current_version(db.session)
+    methods = _credit_methods()
+    reputation = (
+        db.session.query(Request.creator_id, func.avg(Request.score).label('reputation'))
+        .group_by(Request.creator_id)
+        .subquery()
+    )
+    rows = (
+        db.session.query(Credit.id, Credit.name, Credit.amount, Credit.price, Credit.creator_id,
+                         User.username, User.email, methods.c.method, reputation.c.reputation)
+        .outerjoin(User, User.id == Credit.creator_id)
+        .outerjoin(methods, methods.c.credit_id == Credit.id)
+        .outerjoin(reputation, reputation.c.creator_id == Credit.creator_id)
+        .filter(Credit.is_active == True)
+        .all()
+    )
+    return RecommendationIndex(rows, time.monotonic(), version)
+
+def _is_current(index, version, ttl):
+    return (index is not None and index.version == version
+            and time.monotonic() - index.built_at < ttl)
+
+def get_index():
+    global _index
+    ttl = current_app.config.get('RECOMMENDATION_INDEX_TTL', 300)
+    version = current_version(db.session)
+    if _is_current(_index, version, ttl):
+        return _index
+    with _refresh_lock:
+        if not _is_current(_index, version, ttl):
+            _index = build_index()
+        return _index
+
+def buyer_preferences(user_id):
+    """Held credits, creators bought from, method shares and median price per kg"""
+    methods = _credit_methods()
+    rows = (
+        db.session.query(Credit.id, Credit.creator_id, Credit.amount,
+                         func.coalesce(PurchasedCredit.purchase_price, Credit.price).label('price'),
+                         methods.c.method)
+        .select_from(PurchasedCredit)
+        .join(Credit, Credit.id == PurchasedCredit.credit_id)
+        .outerjoin(methods, methods.c.credit_id == Credit.id)
+        .filter(PurchasedCredit.user_id == user_id)
+        .all()
+    )
+    method_counts = {}
+    for r in rows:
+        method = r.method or UNKNOWN_METHOD
+        method_counts[method] = method_counts.get(method, 0) + 1
+    price_per_kg = [r.price / max(r.amount, 1) for r in rows if r.price]
+    return {
+        'held': [r.id for r in rows],
+        'creators': list({r.creator_id for r in rows}),
+        'methods': {m: c / len(rows) for m, c in method_counts.items()},
+        'price_per_kg': float(np.median(price_per_kg)) if price_per_kg else None,
+    }
+
+def recommend(user_id, limit=5):
+    index = get_index()
+    ranked = index.rank(buyer_preferences(user_id), limit)
+    return [{**index.listings[credit_id], "score": score, "reason": reason}
+            for credit_id, score, reason in ranked]
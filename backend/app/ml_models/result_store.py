@@ -0,0 +1,104 @@
+"""
+Stored ML verification results.
+
+Scores are computed once at submit time and kept per model_version, so read
+paths never rescore. When the model version changes, pending requests are
+rescored by a background backfill instead of on the auditor's page load.
+"""
+import threading
+from flask import current_app
+from app import db
+from app.models.verification import VerificationRequest, VerificationMLResult
+from app.ml_models.h2_verification_model import get_h2_model
+
+_backfill_lock = threading.Lock()
+
+def store_result(verification_request_id, ml_result):
+    """Add the result of verify_h2_production to the session (caller commits)"""
+    stored = VerificationMLResult(
+        verification_request_id=verification_request_id,
+        model_version=ml_result['model_version'],
+        is_valid=bool(ml_result['is_valid']),
+        composite_score=ml_result['composite_score'],
+        fraud_probability=ml_result['fraud_probability'],
+        confidence_level=ml_result['confidence_level'],
+        result=ml_result
+    )
+    db.session.add(stored)
+    return stored
+
+def load_results(request_ids, model_version=None):
+    """Map request id -> (stored result, is_current) in one query.
+
+    Prefers the result for ``model_version``; otherwise falls back to the most
+    recent result of any version, flagged as not current.
+    """
+    model_version = model_version or get_h2_model().model_version
+    if not request_ids:
+        return {}
+    rows = (VerificationMLResult.query
+            .filter(VerificationMLResult.verification_request_id.in_(request_ids))
+            .order_by(VerificationMLResult.created_at.asc(), VerificationMLResult.id.asc())
+            .all())
+    results = {}
+    for row in rows:
+        is_current = row.model_version == model_version
+        previous = results.get(row.verification_request_id)
+        if previous is None or is_current or not previous[1]:
+            results[row.verification_request_id] = (row.result, is_current)
+    return results
+
+def rescore(verification):
+    return get_h2_model().verify_h2_production(
+        verification.energy_source_mwh if verification.energy_source_mwh is not None else 1000,
+        verification.hydrogen_amount,
+        verification.production_method,
+        location=verification.location or 'unknown',
+        timestamp=verification.production_date.isoformat() if verification.production_date else None
+    )
+
+def backfill_results(batch_size=100):
+    """Score pending requests that have no result for the current model version"""
+    model_version = get_h2_model().model_version
+    scored = 0
+    last_id = 0
+    while True:
+        has_current = (db.session.query(VerificationMLResult.id)
+                       .filter(VerificationMLResult.verification_request_id == VerificationRequest.id,
+                               VerificationMLResult.model_version == model_version)
+                       .exists())
+        batch = (VerificationRequest.query
+                 .filter(VerificationRequest.status == 'pending', VerificationRequest.id > last_id, ~has_current)
+                 .order_by(VerificationRequest.id.asc())
+                 .limit(batch_size)
+                 .all())
+        if not batch:
+            break
+        for verification in batch:
+            try:
+                store_result(verification.id, rescore(verification))
+                scored += 1
+            except Exception as e:
+                print(f"ML backfill skipped verification {verification.id}: {e}")
+        db.session.commit()
+        last_id = batch[-1].id
+    return scored
+
+def schedule_backfill():
+    """Run backfill_results in a background thread, at most one per process"""
+    if not _backfill_lock.acquire(blocking=False):
+        return False
+    app = current_app._get_current_object()
+
+    def run():
+        try:
+            with app.app_context():
+                scored = backfill_results()
+                print(f"ML backfill rescored {scored} verification(s) with model {get_h2_model().model_version}")
+        except Exception as e:
+            print(f"ML backfill failed: {e}")
+        finally:
+            _backfill_lock.release()
+
+    threading.Thread(target=run, name='ml-backfill', daemon=True).start()
+    return True
@@ -3,3 +3,7 @@ class AuditorAssociation(db.Model):
     __tablename__ = 'auditor_association'
     credit_id = db.Column(db.Integer, db.ForeignKey('credits.id'), primary_key=True)
     auditor_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    pending = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())  # False once the auditor has voted
+
+    # Auditor dashboard lookups: "credits still waiting on my vote"
+    __table_args__ = (db.Index('ix_auditor_association_auditor_pending', 'auditor_id', 'pending'),)
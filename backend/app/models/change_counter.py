@@ -0,0 +1,7 @@
+from app import db
+
+class ChangeCounter(db.Model):
+    """Monotonic change versions, one row per tracked collection (e.g. 'credits')"""
+    __tablename__ = 'change_counters'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
@@ -1,6 +1,6 @@
 from app import db
 from app.models.user import User
-# from app.models.association import AuditorAssociation
+from app.models.association import AuditorAssociation
 
 class Credit(db.Model):
     __tablename__ = 'credits'
@@ -12,6 +12,16 @@ class Credit(db.Model):
     is_expired = db.Column(db.Boolean, default=False)
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     docu_url = db.Column(db.String(200))
-    auditors = db.Column(db.String(500))  # Store as JSON string for SQLite compatibility
+    auditors = db.Column(db.JSON)  # All assigned auditor ids, see AuditorAssociation for lookups
     req_status = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # 'credits' change counter at last change
     creator = db.relationship('User', backref='credits')
+
+    # Delta polling: "what changed since version N", overall and per NGO
+    __table_args__ = (
+        db.Index('ix_credits_version', 'version'),
+        db.Index('ix_credits_creator_version', 'creator_id', 'version'),
+    )
+
+    def cache_tags(self):
+        return {'market', f'ngo:{self.creator_id}'}
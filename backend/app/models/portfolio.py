@@ -0,0 +1,24 @@
+from app import db
+from datetime import datetime
+
+class BuyerPortfolioSummary(db.Model):
+    """Running totals of a buyer's holdings, kept in step by app.utilis.portfolio"""
+    __tablename__ = 'buyer_portfolio_summaries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    credits_count = db.Column(db.Integer, nullable=False, default=0)
+    expired_count = db.Column(db.Integer, nullable=False, default=0)
+    total_invested = db.Column(db.Float, nullable=False, default=0.0)
+    current_value = db.Column(db.Float, nullable=False, default=0.0)
+    hydrogen_offset = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BuyerPortfolioDaily(db.Model):
+    """Per-day changes of a buyer's totals; history series are running sums of these"""
+    __tablename__ = 'buyer_portfolio_daily'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    credits_delta = db.Column(db.Integer, nullable=False, default=0)
+    expired_delta = db.Column(db.Integer, nullable=False, default=0)
+    invested_delta = db.Column(db.Float, nullable=False, default=0.0)
+    value_delta = db.Column(db.Float, nullable=False, default=0.0)
+    offset_delta = db.Column(db.Float, nullable=False, default=0.0)
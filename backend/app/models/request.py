@@ -5,8 +5,12 @@ class Request(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     credit_id = db.Column(db.Integer, db.ForeignKey('credits.id'), nullable=False)
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    auditors = db.Column(db.String(500))  # Store as JSON string for SQLite compatibility
+    auditors = db.Column(db.JSON)  # Auditor ids that have not voted yet
     score = db.Column(db.Integer, default=0)
 
     credit = db.relationship('Credit', backref='requests')
     creator = db.relationship('User', backref='requests')
+
+    def cache_tags(self):
+        # Score and remaining auditors are shown in the NGO credit listing
+        return {f'ngo:{self.creator_id}'}
@@ -10,11 +10,20 @@ class PurchasedCredit(db.Model):
     purchase_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     is_expired = db.Column(db.Boolean, default=False)
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    purchase_price = db.Column(db.Float, nullable=True)  # Credit price paid, null for rows older than the portfolio rollup
     
     user = db.relationship('User', foreign_keys=[user_id], backref='purchased_credits')
     credit = db.relationship('Credit', backref='purchases')
     creator = db.relationship('User', foreign_keys=[creator_id], backref='created_purchases')
 
+    # Portfolio listing filters by buyer and sorts by purchase date
+    __table_args__ = (
+        db.Index('ix_purchased_credits_user_date', 'user_id', 'purchase_date'),
+    )
+
+    def cache_tags(self):
+        return {f'purchased:{self.user_id}'}
+
 class Transactions(db.Model):
     __tablename__ = 'transactions'
     id = db.Column(db.Integer, primary_key=True)
@@ -24,3 +33,14 @@ class Transactions(db.Model):
     total_price = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     txn_hash = db.Column(db.String, nullable=False)
+
+    # Ledger pagination walks (timestamp, id) newest first, optionally per credit;
+    # txn_hash is the purchase idempotency key
+    __table_args__ = (
+        db.Index('ix_transactions_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_transactions_credit_timestamp_id', 'credit_id', 'timestamp', 'id'),
+        db.Index('uq_transactions_txn_hash', 'txn_hash', unique=True),
+    )
+
+    def cache_tags(self):
+        return {'transactions'}
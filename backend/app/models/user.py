@@ -8,3 +8,6 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(20), nullable=False)
+
+    def cache_tags(self):
+        return {'users', f'user:{self.id}'}
@@ -14,6 +14,7 @@ class VerificationRequest(db.Model):
     production_method = db.Column(db.String(50), nullable=False)
     energy_source = db.Column(db.String(50), nullable=False)
     energy_source_mwh = db.Column(db.Float, nullable=True)
+    location = db.Column(db.String(100), nullable=True)  # Facility location, baselines are fitted per location
     
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -26,6 +27,7 @@ class VerificationRequest(db.Model):
     credit = db.relationship('Credit', backref='verification_request')
     documents = db.relationship('VerificationDocument', backref='verification_request', cascade='all, delete-orphan')
     auditor_verification = db.relationship('AuditorVerification', backref='verification_request', uselist=False)
+    ml_results = db.relationship('VerificationMLResult', backref='verification_request', cascade='all, delete-orphan')
 
 class VerificationDocument(db.Model):
     __tablename__ = 'verification_documents'
@@ -62,3 +64,40 @@ class AuditorVerification(db.Model):
     
     # Relationships
     auditor = db.relationship('User', backref='auditor_verifications')
+
+class VerificationMLResult(db.Model):
+    __tablename__ = 'verification_ml_results'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    verification_request_id = db.Column(db.Integer, db.ForeignKey('verification_requests.id'), nullable=False)
+    model_version = db.Column(db.String(20), nullable=False)
+    
+    is_valid = db.Column(db.Boolean, nullable=False)
+    composite_score = db.Column(db.Float, nullable=False)
+    fraud_probability = db.Column(db.Float, nullable=False)
+    confidence_level = db.Column(db.Float, nullable=False)
+    result = db.Column(db.JSON, nullable=False)  # Full verify_h2_production payload
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # One stored score per request and model version
+    __table_args__ = (db.UniqueConstraint('verification_request_id', 'model_version', name='uq_ml_result_request_version'),)
+
+class SubmissionFingerprint(db.Model):
+    """Normalized claim features of a verification request, see ml_models/duplicates.py"""
+    __tablename__ = 'submission_fingerprints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    verification_request_id = db.Column(db.Integer, db.ForeignKey('verification_requests.id'), nullable=False, unique=True)
+    facility = db.Column(db.String(120), nullable=False)
+    production_date = db.Column(db.Date, nullable=False)
+    energy_mwh = db.Column(db.Float, nullable=False)
+    h2_kg = db.Column(db.Float, nullable=False)
+    exact_hash = db.Column(db.String(64), nullable=False, index=True)  # Same facility, date and amounts
+    bucket = db.Column(db.String(64), nullable=False, index=True)  # Facility, date window and amount cells
+    
+    # Earliest earlier claim this one duplicates, and whether exactly or nearly
+    duplicate_of = db.Column(db.Integer, db.ForeignKey('verification_requests.id'), nullable=True)
+    match = db.Column(db.String(10), nullable=True)  # exact, near
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
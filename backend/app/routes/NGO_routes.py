@@ -1,25 +1,78 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app import db, bcrypt
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
+from flask_jwt_extended import jwt_required
+from app import db
 from app.models.credit import Credit
 from app.models.request import Request
+from app.models.association import AuditorAssociation
 from app.models.transaction import PurchasedCredit, Transactions
 from app.models.user import User
-from app.utilis.redis import get_redis
-import random
+from app.utilis.cache import get_or_set, tag_session
+from app.utilis.db_routing import read_only
+from app.utilis.auditor_pool import auditor_pool, sample_least_loaded
+from app.utilis.auth_services import check_password
+from app.utilis.portfolio import record_expiry
+from app.utilis.versioning import current_version, mark_changed
+from app.utilis.events import publish, credit_event
+from app.utilis import identity
+from app.utilis.identity import get_current_user
+from sqlalchemy import func, insert, tuple_
+from datetime import datetime, timedelta
 import json
+import base64
+import csv
+import io
+import math
 
 NGO_bp = Blueprint('NGO', __name__)
-redis_client = get_redis()
-def get_current_user():
-    try:
-        return json.loads(get_jwt_identity())
-    except json.JSONDecodeError:
-        return None
 
 def numberOfAuditors(k) -> int:
     return int((k//500)*2 + 3)
 
+MAX_CREDITS_PAGE_SIZE = 500
+
+def credit_listing_query(creator_id, after=None, limit=None, since=None):
+    """Credits of an NGO joined with their (first) audit request in one round trip.
+
+    Keyset paginated over Credit.id: pass the last id seen as ``after``.
+    ``since`` keeps only credits changed after that change version.
+    """
+    first_request = (
+        db.session.query(Request.credit_id, func.min(Request.id).label('request_id'))
+        .filter(Request.creator_id == creator_id)
+        .group_by(Request.credit_id)
+        .subquery()
+    )
+    query = (
+        db.session.query(Credit, Request.score, Request.auditors)
+        .outerjoin(first_request, first_request.c.credit_id == Credit.id)
+        .outerjoin(Request, Request.id == first_request.c.request_id)
+        .filter(Credit.creator_id == creator_id)
+        .order_by(Credit.id.asc())
+    )
+    if after is not None:
+        query = query.filter(Credit.id > after)
+    if since is not None:
+        query = query.filter(Credit.version > since)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def _credit_listing(creator_id, after=None, limit=None, since=None):
+    return [{
+        "id": c.id,
+        "name": c.name,
+        "amount": c.amount,
+        "price": c.price,
+        "is_active": c.is_active,
+        "is_expired": c.is_expired,
+        "creator_id": c.creator_id,
+        "secure_url": c.docu_url,
+        "req_status": c.req_status,
+        "auditors_count": len(c.auditors),
+        "auditor_left": len(req_auditors) if req_auditors else 0,
+        "score": score if score is not None else 0
+    } for c, score, req_auditors in credit_listing_query(creator_id, after=after, limit=limit, since=since)]
+
 @NGO_bp.route('/api/NGO/credits', methods=['GET', 'POST'])
 @jwt_required()
 def manage_credits():
@@ -27,67 +80,51 @@ def manage_credits():
     if current_user.get('role') != 'NGO':
         return jsonify({"message": "Unauthorized"}), 403
 
-    user = User.query.filter_by(username=current_user.get('username')).first()
+    user = identity.current_user()
 
-    key = user.username
     # Ensure only credits created by this NGO are visible
     if request.method == 'GET':
-        if redis_client:
-            try:
-                cached_credits = redis_client.get(key)
-                if cached_credits:
-                    print("cache hit credit")
-                    print(f"key: {key}")
-                    return jsonify(json.loads(cached_credits))
-                else:
-                    print("cache miss credit")
-                    print(f"key: {key}")
-            except Exception as e:
-                print(f"redis get client error: {e}")
-        credits = Credit.query.filter_by(creator_id=user.id).order_by(Credit.id.asc()).all()
-        data = []
-        for c in credits:
-            req = Request.query.filter_by(credit_id=c.id).first()
-            data.append({
-                "id": c.id,
-                "name": c.name,
-                "amount": c.amount,
-                "price": c.price,
-                "is_active": c.is_active,
-                "is_expired": c.is_expired,
-                "creator_id": c.creator_id,
-                "secure_url": c.docu_url,
-                "req_status": c.req_status,
-                "auditors_count": len(c.auditors),
-                "auditor_left": len(req.auditors) if req and req.auditors else 0,
-                "score": req.score if req else 0
-            })
-        if redis_client:
-            try:
-                redis_client.set(key, json.dumps(data))
-            except Exception as e:
-                print(f"Redis error: {e}")
-        return jsonify(data), 200
+        version = current_version(db.session)
+        since = request.args.get('since', type=int)
+        if since is not None:
+            return jsonify({"version": version, "credits": _credit_listing(user.id, since=since)}), 200
+
+        # Any change to one of this NGO's credits raises their highest version
+        latest = db.session.query(func.max(Credit.version)).filter(Credit.creator_id == user.id).scalar()
+        etag = f"ngo-{user.id}-{latest or 0}-{request.query_string.decode()}"
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['X-Listing-Version'] = str(version)
+            return response
+
+        after = request.args.get('after', type=int)
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_CREDITS_PAGE_SIZE))
+
+        if after is None and limit is None:
+            data = get_or_set(f"ngo:{user.id}:credits", lambda: _credit_listing(user.id),
+                              tags=[f"ngo:{user.id}"])
+            response = jsonify(data)
+        else:
+            # Pages are not cached, only the full listing is
+            data = _credit_listing(user.id, after=after, limit=limit)
+            response = jsonify(data)
+            if limit is not None and len(data) == limit:
+                response.headers['X-Next-After'] = str(data[-1]['id'])
+        response.set_etag(etag)
+        response.headers['X-Listing-Version'] = str(version)
+        return response, 200
 
     # Allow the NGO to create new credits
     if request.method == 'POST':
-        
-        if redis_client:
-            try:
-                # cached_credits = redis_client.get(key)
-                redis_client.delete(key)
-                print("cache credit delete")
-                print(f"key: {key}")
-            except:
-                pass
         #do something regarding the amount 
         data = request.json
 
-        auditors = User.query.filter_by(role = 'auditor').all()
-        auditor_ids = [auditor.id for auditor in auditors]
         k = numberOfAuditors(int(data['amount']))
         try:
-            selected_auditor_ids = random.sample(auditor_ids, k)
+            selected_auditor_ids = auditor_pool.sample(k)
         except ValueError:
             return jsonify({"message": "Not enough auditors"}), 503
         
@@ -109,12 +146,105 @@ def manage_credits():
             auditors=selected_auditor_ids
         )
         db.session.add(new_request)
+        db.session.add_all([
+            AuditorAssociation(credit_id=data['creditId'], auditor_id=auditor_id)
+            for auditor_id in selected_auditor_ids
+        ])
 
-        
         db.session.commit()
+        auditor_pool.record_assignments(selected_auditor_ids)
+        publish('audit.assigned', {"credit_ids": [data['creditId']]}, users=selected_auditor_ids)
         return jsonify({"message": "Credit created successfully"}), 201
 
 
+MAX_BULK_CREDITS = 1000
+CREDIT_FIELDS = ('creditId', 'name', 'amount', 'price', 'secure_url')
+
+@NGO_bp.route('/api/NGO/credits/bulk', methods=['POST'])
+@jwt_required()
+def bulk_create_credits():
+    """Create a batch of credits in one transaction.
+
+    The auditor pool and its open workload are loaded once and every credit
+    gets the least loaded auditors, so a monthly batch spreads across the pool.
+    """
+    current_user = get_current_user()
+    if current_user.get('role') != 'NGO':
+        return jsonify({"message": "Unauthorized"}), 403
+
+    user = identity.current_user()
+
+    credits = (request.json or {}).get('credits')
+    if not isinstance(credits, list) or not credits:
+        return jsonify({"message": "Expected a non-empty 'credits' list"}), 400
+    if len(credits) > MAX_BULK_CREDITS:
+        return jsonify({"message": f"At most {MAX_BULK_CREDITS} credits per batch"}), 400
+    for i, item in enumerate(credits):
+        if not isinstance(item, dict):
+            return jsonify({"message": f"Credit {i} must be an object"}), 400
+        missing = [field for field in CREDIT_FIELDS if field not in item]
+        if missing:
+            return jsonify({"message": f"Credit {i} is missing {', '.join(missing)}"}), 400
+        try:
+            credits[i] = dict(item, creditId=int(item['creditId']), amount=int(item['amount']),
+                              price=float(item['price']))
+        except (TypeError, ValueError):
+            return jsonify({"message": f"Credit {i} needs an integer creditId and amount and a numeric price"}), 400
+        if credits[i]['amount'] <= 0 or not math.isfinite(credits[i]['price']) or credits[i]['price'] < 0:
+            return jsonify({"message": f"Credit {i} needs a positive amount and a non-negative price"}), 400
+
+    credit_ids = [item['creditId'] for item in credits]
+    if len(set(credit_ids)) != len(credit_ids):
+        return jsonify({"message": "Duplicate creditId in batch"}), 400
+    existing = [row[0] for row in db.session.query(Credit.id).filter(Credit.id.in_(credit_ids)).all()]
+    if existing:
+        return jsonify({"message": "Credits already exist", "credit_ids": existing}), 409
+
+    workload = auditor_pool.workload()
+    assignments = {}
+    try:
+        for item in credits:
+            assignments[item['creditId']] = sample_least_loaded(workload, numberOfAuditors(item['amount']))
+    except ValueError:
+        return jsonify({"message": "Not enough auditors"}), 503
+
+    db.session.execute(insert(Credit), [{
+        "id": item['creditId'],
+        "name": item['name'],
+        "amount": item['amount'],
+        "price": item['price'],
+        "creator_id": user.id,
+        "docu_url": item['secure_url'],
+        "auditors": assignments[item['creditId']],
+        "req_status": 1
+    } for item in credits])
+    db.session.execute(insert(Request), [{
+        "credit_id": credit_id,
+        "creator_id": user.id,
+        "auditors": auditor_ids
+    } for credit_id, auditor_ids in assignments.items()])
+    db.session.execute(insert(AuditorAssociation), [
+        {"credit_id": credit_id, "auditor_id": auditor_id}
+        for credit_id, auditor_ids in assignments.items()
+        for auditor_id in auditor_ids
+    ])
+    # Bulk inserts skip the unit of work, so name the changes and cache tags explicitly
+    mark_changed(db.session, *assignments)
+    tag_session(db.session, f"ngo:{user.id}")
+    db.session.commit()
+    auditor_pool.record_assignments(a for auditor_ids in assignments.values() for a in auditor_ids)
+    assigned = {}
+    for credit_id, auditor_ids in assignments.items():
+        for auditor_id in auditor_ids:
+            assigned.setdefault(auditor_id, []).append(credit_id)
+    for auditor_id, credit_ids in assigned.items():
+        publish('audit.assigned', {"credit_ids": credit_ids}, users=[auditor_id])
+
+    return jsonify({
+        "message": f"{len(credits)} credits created successfully",
+        "assignments": {str(credit_id): auditor_ids for credit_id, auditor_ids in assignments.items()}
+    }), 201
+
 @NGO_bp.route('/api/NGO/credits/expire/<int:credit_id>', methods=['PATCH'])
 @jwt_required()
 def expire_credit(credit_id):
@@ -122,7 +252,7 @@ def expire_credit(credit_id):
     if current_user.get('role') != 'NGO':
         return jsonify({"message": "Unauthorized"}), 403
 
-    user = User.query.filter_by(username=current_user.get('username')).first()
+    user = identity.current_user()
     credit = Credit.query.get(credit_id)
     pc = PurchasedCredit.query.filter_by(credit_id=credit.id).first()
 
@@ -135,47 +265,149 @@ def expire_credit(credit_id):
         return jsonify({"message": "You do not have permission to expire this credit"}), 403
 
     # Expire the credit
+    record_expiry(pc)
     credit.is_active = False
     credit.is_expired = True
     pc.is_expired = True
     db.session.commit()
+    publish('credit.expired', credit_event(credit), users=[credit.creator_id, pc.user_id])
     return jsonify({"message": "Credit expired successfully"}), 200
 
+DEFAULT_LEDGER_PAGE_SIZE = 100
+MAX_LEDGER_PAGE_SIZE = 1000
+LEDGER_STREAM_BATCH = 1000
+LEDGER_FIELDS = ("id", "buyer", "credit", "amount", "total_price", "timestamp", "txn_hash")
+
 @NGO_bp.route('/api/NGO/transactions', methods=['GET'])
 @jwt_required()
+@read_only
 def get_transactions():
+    """Transaction ledger, newest first.
+
+    Query params: creator (NGO user id), credit, from / to (ISO dates),
+    limit and cursor (from the X-Next-Cursor header of the previous page).
+    format=ndjson|csv streams the whole filtered ledger instead of a page.
+    """
     current_user = get_current_user()
     if current_user.get('role') != 'NGO':
         return jsonify({"message": "Unauthorized"}), 403
-    key = current_user.get('username')+"trans"
-    if redis_client:
-        try:
-            cached_txns = redis_client.get(key)
-            if cached_txns:
-                print("Cache hit")
-                return jsonify(json.loads(cached_txns)), 200
-            else:
-                print("Cache miss")
-        except Exception as e:
-            print(f"redis get client error: {e}")
-    transactions = Transactions.query.order_by(Transactions.timestamp.desc()).all()
-    transaction_list = []
-    for t in transactions:
-        transaction_list.append({
-            "id": t.id,
-            "buyer": t.buyer_id,
-            "credit": t.credit_id,
-            "amount": t.amount,
-            "total_price": t.total_price,
-            "timestamp": t.timestamp.isoformat(),
-            "txn_hash": t.txn_hash
-        })
-        if redis_client:
+
+    try:
+        filters = _ledger_filters(request.args)
+        cursor = _decode_ledger_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    export_format = request.args.get('format')
+    if export_format in ('ndjson', 'csv'):
+        return _stream_ledger(filters, export_format)
+    if export_format is not None:
+        return jsonify({"message": "format must be 'ndjson' or 'csv'"}), 400
+
+    limit = request.args.get('limit', DEFAULT_LEDGER_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_LEDGER_PAGE_SIZE))
+    key = "transactions:" + ":".join(f"{k}={v}" for k, v in sorted({**filters, 'cursor': cursor, 'limit': limit}.items()))
+    page = get_or_set(key, lambda: _ledger_page(filters, cursor, limit), tags=["transactions"])
+
+    response = jsonify(page)
+    if len(page) == limit:
+        response.headers['X-Next-Cursor'] = _encode_ledger_cursor(page[-1])
+    return response
+
+def _ledger_filters(args):
+    filters = {}
+    for name in ('creator', 'credit'):
+        if args.get(name) is not None:
             try:
-                redis_client.set(key,json.dumps(transaction_list),px=500)
-            except Exception as e:
-                print(f"Redis error: {e}")
-    return jsonify(transaction_list)
+                filters[name] = int(args[name])
+            except ValueError:
+                raise ValueError(f"'{name}' must be an integer")
+    for name in ('from', 'to'):
+        if args.get(name):
+            try:
+                filters[name] = datetime.fromisoformat(args[name]).isoformat()
+            except ValueError:
+                raise ValueError(f"'{name}' must be an ISO date")
+    return filters
+
+def _encode_ledger_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row["timestamp"], row["id"]]).encode()).decode()
+
+def _decode_ledger_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        timestamp, txn_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp).isoformat(), int(txn_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _ledger_query(filters):
+    query = db.session.query(
+        Transactions.id, Transactions.buyer_id, Transactions.credit_id, Transactions.amount,
+        Transactions.total_price, Transactions.timestamp, Transactions.txn_hash
+    )
+    if 'creator' in filters:
+        query = query.join(Credit, Credit.id == Transactions.credit_id).filter(Credit.creator_id == filters['creator'])
+    if 'credit' in filters:
+        query = query.filter(Transactions.credit_id == filters['credit'])
+    if 'from' in filters:
+        query = query.filter(Transactions.timestamp >= datetime.fromisoformat(filters['from']))
+    if 'to' in filters:
+        # Inclusive of the whole 'to' day when only a date is given
+        to = datetime.fromisoformat(filters['to'])
+        if to.time() == datetime.min.time():
+            query = query.filter(Transactions.timestamp < to + timedelta(days=1))
+        else:
+            query = query.filter(Transactions.timestamp <= to)
+    return query.order_by(Transactions.timestamp.desc(), Transactions.id.desc())
+
+def _ledger_row(t):
+    return {
+        "id": t.id,
+        "buyer": t.buyer_id,
+        "credit": t.credit_id,
+        "amount": t.amount,
+        "total_price": t.total_price,
+        "timestamp": t.timestamp.isoformat(),
+        "txn_hash": t.txn_hash
+    }
+
+def _ledger_page(filters, cursor, limit):
+    query = _ledger_query(filters)
+    if cursor is not None:
+        timestamp, txn_id = cursor
+        query = query.filter(tuple_(Transactions.timestamp, Transactions.id) < (datetime.fromisoformat(timestamp), txn_id))
+    return [_ledger_row(t) for t in query.limit(limit)]
+
+def _stream_ledger(filters, export_format):
+    # yield_per makes psycopg2 use a server-side cursor, so rows are never all in memory
+    rows = _ledger_query(filters).yield_per(LEDGER_STREAM_BATCH)
+
+    def generate_ndjson():
+        for t in rows:
+            yield json.dumps(_ledger_row(t)) + "\n"
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(LEDGER_FIELDS)
+        for i, t in enumerate(rows, 1):
+            row = _ledger_row(t)
+            writer.writerow([row[field] for field in LEDGER_FIELDS])
+            if i % LEDGER_STREAM_BATCH == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    if export_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=transactions.{export_format}"
+    })
 
 
 @NGO_bp.route('/api/NGO/expire-req', methods=['POST'])
@@ -195,17 +427,13 @@ def check_expire_request():
         return jsonify({"message": "User not found"}), 404
 
     #check if the given password was true 
-    if bcrypt.check_password_hash(user.password, data['password']):
+    if check_password(user.password, data['password']):
         return jsonify({"message": "User verified succesfully! can proceed to expire credit"}), 200
     return jsonify({"message": "Invalid credentials"}), 401
 
 @NGO_bp.route('/api/NGO/audit-req', methods=['GET'])
 @jwt_required()
 def check_audit_request():
-    auditors = User.query.filter_by(role = 'auditor').all()
-    num_auditors = len(auditors)
-    # print("auditors avail:",num_auditors)
-
     hydrogen_amount = request.args.get('amount')
     if not hydrogen_amount:
         return jsonify({"message": "Missing 'amount' parameter"}), 400
@@ -217,7 +445,7 @@ def check_audit_request():
     
     req_auditors = numberOfAuditors(int(hydrogen_amount))
 
-    if num_auditors < req_auditors:
+    if not auditor_pool.has_capacity(req_auditors):
         return jsonify({"message": f"Not Enough Auditors for {hydrogen_amount} kg of hydrogen. Maybe split the credit !"}), 503
     
     return jsonify({"message": f"Enough auditors for the credit"}), 200
@@ -1,19 +1,15 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app import db, bcrypt
 from app.models.credit import Credit
 from app.models.request import Request
+from app.models.association import AuditorAssociation
 from app.models.transaction import PurchasedCredit, Transactions 
-from app.models.user import User
-from app.utilis.redis import get_redis
-import json
+from app.utilis.events import publish
+from app.utilis.auditor_pool import auditor_pool
+from app.utilis import identity
+from app.utilis.identity import get_current_user
 auditor_bp = Blueprint('auditor', __name__)
-redis_client = get_redis()
-def get_current_user():
-    try:
-        return json.loads(get_jwt_identity())
-    except json.JSONDecodeError:
-        return None
 
 @auditor_bp.route('/api/auditor/credits', methods=['GET'])
 @jwt_required()
@@ -21,13 +17,14 @@ def manage_credits():
     current_user = get_current_user()
     if current_user.get('role') != 'auditor':
         return jsonify({"message": "Unauthorized"}), 403
-    user = User.query.filter_by(username=current_user.get('username')).first()
+    user = identity.current_user()
     # key = user.username
-    requests = Request.query.filter(Request.auditors.contains([user.id])).all()
-    
-    credit_ids = [r.credit_id for r in requests]
-
-    credits = Credit.query.filter(Credit.id.in_(credit_ids)).all()
+    credits = (
+        Credit.query
+        .join(AuditorAssociation, AuditorAssociation.credit_id == Credit.id)
+        .filter(AuditorAssociation.auditor_id == user.id, AuditorAssociation.pending.is_(True))
+        .all()
+    )
     data = [{
         "id": credit.id,
         "name": credit.name,
@@ -50,21 +47,11 @@ def audit_credit(credit_id):
 
     
     # print("credit id", credit_id)
-    user = User.query.filter_by(username=current_user.get('username')).first()
+    user = identity.current_user()
     request_obj = Request.query.filter_by(credit_id=credit_id).first()
-    cid = request_obj.creator_id
-    print(f"creator_id: {cid}")
-    cu_ngo = User.query.filter_by(id =cid).first()
-    key = cu_ngo.username
-    print(f"key: {key}")
-    if redis_client:
-        try:
-            redis_client.delete(key)
-            print("deleted cached credits")
-        except:
-            pass
 
-    if not request_obj or user.id not in request_obj.auditors:
+    assignment = AuditorAssociation.query.filter_by(credit_id=credit_id, auditor_id=user.id, pending=True).first()
+    if not request_obj or not assignment:
         return jsonify({"message": "Not assigned or already audited"}), 404
 
     
@@ -74,8 +61,9 @@ def audit_credit(credit_id):
         request_obj.score -= 1
 
     
-    # Remove auditor
-    request_obj.auditors.remove(user.id)
+    # Remove auditor (reassign so the JSON column change is tracked)
+    assignment.pending = False
+    request_obj.auditors = [a for a in request_obj.auditors if a != user.id]
 
     # If no auditors left, update req_status in Credit table
     if len(request_obj.auditors) == 0:
@@ -84,5 +72,12 @@ def audit_credit(credit_id):
             credit.req_status = 2
             
     db.session.commit()
+    auditor_pool.record_vote(user.id)
+    publish('audit.vote', {
+        "credit_id": credit_id,
+        "score": request_obj.score,
+        "auditors_left": len(request_obj.auditors),
+        "completed": len(request_obj.auditors) == 0
+    }, users=[request_obj.creator_id])
 
     return jsonify({"message": f"Audit completed, vote: {data['vote']}"}), 200
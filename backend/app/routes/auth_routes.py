@@ -1,17 +1,22 @@
-import requests
 from flask import Blueprint, request, jsonify
-from app import db, bcrypt, create_access_token
+from app import db, create_access_token
 from app.models.user import User
+from app.utilis.auth_services import AuthBusyError, hash_password, check_password, verify_captcha
+from app.utilis.identity import token_claims, remember, current_user
 import json
 import os
 from dotenv import load_dotenv
 from datetime import timedelta
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 
 load_dotenv()
 
 auth_bp = Blueprint('auth', __name__)
-SECRET_KEY =os.getenv('SECRET_KEY','1x0000000000000000000000000000000AA')
+
+@auth_bp.app_errorhandler(AuthBusyError)
+def auth_busy(e):
+    return jsonify({"message": "Server busy, please retry"}), 503
+
 @auth_bp.route('/api/signup', methods=['POST'])
 def signup():
     data = request.json
@@ -24,15 +29,10 @@ def signup():
     # For development, skip CAPTCHA verification
     captcha_response = data.get('cf-turnstile-response')
     if captcha_response:
-        captcha_verify = requests.post('https://challenges.cloudflare.com/turnstile/v0/siteverify',
-                                       data={
-                                       'secret': SECRET_KEY,
-                                       'response': captcha_response,
-                                       }).json()
-        if not captcha_verify.get('success'):
+        if not verify_captcha(captcha_response, request.remote_addr):
             return jsonify({"message":"CAPTCHA failed"}),400
     
-    hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    hashed_password = hash_password(data['password'])
     new_user = User(username=data['username'], email=data['email'], password=hashed_password, role=data['role'])
     db.session.add(new_user)
     db.session.commit()
@@ -43,12 +43,14 @@ def login():
     data = request.json
     user = User.query.filter_by(username=data['username']).first()
 
-    if user and bcrypt.check_password_hash(user.password, data['password']):
+    if user and check_password(user.password, data['password']):
         if data['role'] != user.role:
             return jsonify({"message": "Unauthorized"}),403
         identity = json.dumps({"username": user.username, "role": user.role})
         expires = timedelta(hours=12)
-        access_token = create_access_token(identity=identity, expires_delta= expires)
+        access_token = create_access_token(identity=identity, expires_delta= expires,
+                                           additional_claims=token_claims(user))
+        remember(user)
         return jsonify(access_token=access_token,role=user.role), 200
     return jsonify({"message": "Invalid credentials"}), 401
 
@@ -57,12 +59,7 @@ def login():
 def get_profile():
     """Get user profile"""
     try:
-        identity = get_jwt_identity()
-        user_data = json.loads(identity)
-        username = user_data.get('username')
-        role = user_data.get('role')
-        
-        user = User.query.filter_by(username=username).first()
+        user = current_user()
         if not user:
             return jsonify({"message": "User not found"}), 404
             
@@ -1,50 +1,70 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
 from app.models.user import User
 from app.models.credit import Credit
 from app.models.transaction import PurchasedCredit
 from app.models.transaction import Transactions
-from app.utilis.redis import get_redis
-# Use simple certificate only - no WeasyPrint
+from app.utilis.cache import get_or_set, get_listing, tag_session
+from app.utilis.db_routing import read_only
+from app.utilis.portfolio import portfolio_summary, portfolio_history, record_purchase
+from app.ml_models.recommender import recommend
+from app.utilis.versioning import current_version, mark_changed
+from app.utilis.events import publish, credit_event
+# HTML certificates are always available, PDFs only when the render pool is enabled
 from app.utilis.simple_certificate import generate_simple_certificate as generate_certificate_data
+from app.utilis.certificate_renderer import certificate_digest, pdf_enabled, request_pdf
+from app.utilis import identity
+from app.utilis.identity import get_current_user
 import json
-import io
-import base64
-# WeasyPrint is not available
-WEASYPRINT_AVAILABLE = False
+from datetime import date
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from app import db
 
 buyer_bp = Blueprint('buyer_bp', __name__)
-redis_client = get_redis()
-def get_current_user():
-    try:
-        return json.loads(get_jwt_identity())
-    except json.JSONDecodeError:
-        return None
 
 @buyer_bp.route('/api/buyer/credits', methods=['GET'])
 @jwt_required()
+@read_only
 def buyer_credits():
-    key = "buyer_credits"
-    if redis_client:
-        try:
-            cached_credits = redis_client.get(key)
-            if cached_credits:
-                print("cache hit buyer_credits")
-                return jsonify(json.loads(cached_credits))
-            else:
-                print("cache miss buyer_credits")
-        except Exception as e:
-            print(f"redis get client error: {e}")
-    credits = Credit.query.filter_by(is_active =True).all()
-    data = [{"id": c.id, "name": c.name, "amount": c.amount, "price": c.price,"creator":c.creator_id, "secure_url": c.docu_url} for c in credits]
-    if redis_client:
-        try:
-            redis_client.set(key, json.dumps(data))
-            print("buyer_credits cached")
-        except:
-            pass
-    return jsonify(data)
+    """Marketplace listing.
+
+    ?page=N returns one MARKET_PAGE_SIZE page (X-Total-Pages header).
+    Responses carry an ETag and X-Listing-Version; ?since=<version> returns
+    only the credits changed after that version, inactive ones included.
+    """
+    since = request.args.get('since', type=int)
+    if since is not None:
+        version = current_version(db.session)
+        return jsonify({"version": version, "credits": _credit_changes(since)})
+
+    page = request.args.get('page', type=int)
+    if page is not None and page < 1:
+        return jsonify({"message": "page starts at 1"}), 400
+    listing = get_listing("market:active", _active_credit_list, tags=["market"], page=page,
+                          page_size=current_app.config['MARKET_PAGE_SIZE'],
+                          soft_ttl=current_app.config['MARKET_SOFT_TTL'],
+                          version_of=lambda: current_version(db.session))
+    etag = f"market-{listing.version}-{page or 'all'}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(listing.items)
+    response.set_etag(etag)
+    response.headers['X-Listing-Version'] = str(listing.version)
+    response.headers['X-Total-Pages'] = str(listing.pages)
+    return response
+
+def _credit_fields(c):
+    return {"id": c.id, "name": c.name, "amount": c.amount, "price": c.price,"creator":c.creator_id, "secure_url": c.docu_url}
+
+def _active_credit_list():
+    credits = Credit.query.filter_by(is_active =True).order_by(Credit.id).all()
+    return [_credit_fields(c) for c in credits]
+
+def _credit_changes(since):
+    credits = Credit.query.filter(Credit.version > since).order_by(Credit.version, Credit.id).all()
+    return [{**_credit_fields(c), "is_active": c.is_active, "version": c.version} for c in credits]
 
 @buyer_bp.route('/api/buyer/purchase', methods=['POST'])
 @jwt_required()
@@ -60,53 +80,89 @@ def purchase_credit():
     if 'txn_hash' not in data:
         return jsonify({"message": "Missing txn_hash"}), 400
 
-    # Retrieve the credit
-    credit = Credit.query.get(data['credit_id'])
-    if not credit:
-        return jsonify({"message": "Credit not found"}), 404
-
     # Check if the current user exists
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    # Check if the credit already exists in the purchased_credits table
-    existing_credit = PurchasedCredit.query.filter_by(credit_id=credit.id).first()
-    if existing_credit:
-        db.session.delete(existing_credit)
-
-    # Add new entry to purchased_credits
-    purchased_credit = PurchasedCredit(
-        user_id=user.id,
-        credit_id=credit.id,
-        amount=credit.amount,
-        creator_id=credit.creator_id,
-    )
+    # txn_hash is the idempotency key: a retry of a recorded purchase is replayed
+    replay = _purchase_replay(user.id, data)
+    if replay is not None:
+        return replay
 
-    # Record the transaction
-    transaction = Transactions(
-        buyer_id=user.id,
-        credit_id=credit.id,
-        amount=credit.amount,
-        total_price=credit.price,
-        txn_hash=data['txn_hash']
-    )
-    key = "buyer_credits"
-    if redis_client:
-        try:
-            redis_client.delete(key)
-        except Exception as e:
-            print(f"redis get client error: {e}")
-    # Update the credit to inactive
-    credit.is_active = False
-
-    # Add and commit the changes
-    db.session.add(purchased_credit)
-    db.session.add(transaction)
-    db.session.commit()
+    credit = Credit.query.get(data['credit_id'])
+    if not credit:
+        return jsonify({"message": "Credit not found"}), 404
+    if not credit.is_active:
+        return _purchase_conflict(credit.id)
+    price = credit.price
+
+    try:
+        # Record the transaction first so a concurrent retry fails on the
+        # unique txn_hash index before it can touch the credit
+        transaction = Transactions(
+            buyer_id=user.id,
+            credit_id=credit.id,
+            amount=credit.amount,
+            total_price=price,
+            txn_hash=data['txn_hash']
+        )
+        db.session.add(transaction)
+        db.session.flush()
+
+        # Claim the credit: only one buyer can flip is_active, and only at the
+        # price they saw; the row stays locked until commit
+        claimed = db.session.execute(
+            update(Credit)
+            .where(Credit.id == credit.id, Credit.is_active == True, Credit.price == price)
+            .values(is_active=False)
+        ).rowcount
+        if claimed != 1:
+            db.session.rollback()
+            return _purchase_conflict(credit.id)
+        mark_changed(db.session, credit.id)
+
+        # Check if the credit already exists in the purchased_credits table
+        existing_credit = (PurchasedCredit.query.filter_by(credit_id=credit.id)
+                           .with_for_update().first())
+        # Move the credit between the portfolio rollups before the holdings change
+        record_purchase(user.id, credit, previous_holding=existing_credit)
+        if existing_credit:
+            db.session.delete(existing_credit)
+
+        # Add new entry to purchased_credits
+        purchased_credit = PurchasedCredit(
+            user_id=user.id,
+            credit_id=credit.id,
+            amount=credit.amount,
+            creator_id=credit.creator_id,
+            purchase_price=price,
+        )
+        db.session.add(purchased_credit)
+        # The UPDATE bypasses the unit of work, so the listing tags are not collected
+        tag_session(db.session, 'market', f'ngo:{credit.creator_id}')
+        db.session.commit()
+        publish('credit.sold', credit_event(credit))
+    except IntegrityError:
+        # Lost the race on txn_hash to a concurrent request
+        db.session.rollback()
+        replay = _purchase_replay(user.id, data)
+        return replay if replay is not None else _purchase_conflict(data['credit_id'])
 
     return jsonify({"message": "Credit purchased successfully"}), 200
 
+def _purchase_conflict(credit_id):
+    return jsonify({"message": "Credit is no longer available", "credit_id": credit_id}), 409
+
+def _purchase_replay(buyer_id, data):
+    """Response for a txn_hash that is already recorded, None if it is new"""
+    transaction = Transactions.query.filter_by(txn_hash=data['txn_hash']).first()
+    if transaction is None:
+        return None
+    if transaction.buyer_id == buyer_id and str(transaction.credit_id) == str(data['credit_id']):
+        return jsonify({"message": "Credit purchased successfully", "replayed": True}), 200
+    return jsonify({"message": "txn_hash was already used for another purchase"}), 409
+
 
 @buyer_bp.route('/api/buyer/sell', methods=['PATCH'])
 @jwt_required()
@@ -131,6 +187,7 @@ def sell_credit():
             credit.req_status = 3
             
         db.session.commit()
+        publish('credit.listed', credit_event(credit))
 
         return jsonify({"message": f"Credit put to sale with price {data['salePrice']}" }), 200
     return jsonify({"message": "Can't sell at this point"}), 400
@@ -152,52 +209,85 @@ def remove_credit():
     if credit:
         credit.is_active = False
         db.session.commit()
+        publish('credit.unlisted', credit_event(credit))
 
         return jsonify({"message": "Credit removed from sale" }), 200
     return jsonify({"message": "For some reason cant remove from sale, man if error is coming here we are cooked"}), 400
 
+PURCHASED_SORT_COLUMNS = {
+    'purchase_date': PurchasedCredit.purchase_date,
+    'name': Credit.name,
+    'amount': PurchasedCredit.amount,
+    'price': Credit.price,
+}
+MAX_PURCHASED_PAGE_SIZE = 500
+
 @buyer_bp.route('/api/buyer/purchased', methods=['GET'])
 @jwt_required()
+@read_only
 def get_purchased_credits():
     current_user = get_current_user()
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
-    key = user.username
-    if redis_client:
-        try:
-            cached_purchased = redis_client.get(key)
-            if cached_purchased:
-                return jsonify(json.loads(cached_purchased)), 200
-        except Exception as e:
-            print(f"redis get client error: {e}")
-
-    purchased_credits = PurchasedCredit.query.filter_by(user_id=user.id).all()
-    credits = []
-    for pc in purchased_credits:
-        credit = Credit.query.get(pc.credit_id)
-        creator = User.query.get(pc.creator_id) if pc.creator_id else None
-        credits.append({
-            "id": credit.id,
-            "name": credit.name,
-            "amount": pc.amount,
-            "price": credit.price,
-            "is_active": credit.is_active,
-            "is_expired": credit.is_expired,
-            "creator": {
-                "id": creator.id,
-                "username": creator.username,
-                "email": creator.email
-            } if creator else None
-        })
-        if redis_client:
-            try:
-                redis_client.set(key,json.dumps(credits),px=500)
-                print("puchased cached")
-            except:
-                pass
-    return jsonify(credits), 200
+    sort = request.args.get('sort', 'purchase_date')
+    order = request.args.get('order', 'desc')
+    if sort not in PURCHASED_SORT_COLUMNS or order not in ('asc', 'desc'):
+        return jsonify({"message": f"sort must be one of {sorted(PURCHASED_SORT_COLUMNS)} and order asc or desc"}), 400
+    page = request.args.get('page', type=int)
+    per_page = request.args.get('per_page', type=int)
+
+    user = identity.current_user()
+    tags = [f"purchased:{user.id}"]
+
+    if page is None and per_page is None:
+        credits = get_or_set(f"purchased:{user.id}:{sort}:{order}",
+                             lambda: _purchased_credit_list(user.id, sort, order), tags=tags)
+        return jsonify(credits), 200
+
+    page = max(1, page or 1)
+    per_page = max(1, min(per_page or 50, MAX_PURCHASED_PAGE_SIZE))
+    data = get_or_set(f"purchased:{user.id}:{sort}:{order}:{page}:{per_page}",
+                      lambda: {
+                          "items": _purchased_credit_list(user.id, sort, order, page, per_page),
+                          "total": PurchasedCredit.query.filter_by(user_id=user.id).count(),
+                      }, tags=tags)
+    response = jsonify(data['items'])
+    response.headers['X-Total-Count'] = str(data['total'])
+    return response, 200
+
+def purchased_credit_query(user_id, sort='purchase_date', order='desc'):
+    """Purchases of a buyer joined with their credit and creator in one round trip"""
+    column = PURCHASED_SORT_COLUMNS[sort]
+    direction = column.asc() if order == 'asc' else column.desc()
+    tiebreak = PurchasedCredit.id.asc() if order == 'asc' else PurchasedCredit.id.desc()
+    return (
+        db.session.query(PurchasedCredit.amount, Credit.id, Credit.name, Credit.price,
+                         Credit.is_active, Credit.is_expired,
+                         User.id.label('creator_id'), User.username, User.email)
+        .join(Credit, Credit.id == PurchasedCredit.credit_id)
+        .outerjoin(User, User.id == PurchasedCredit.creator_id)
+        .filter(PurchasedCredit.user_id == user_id)
+        .order_by(direction, tiebreak)
+    )
+
+def _purchased_credit_list(user_id, sort='purchase_date', order='desc', page=None, per_page=None):
+    query = purchased_credit_query(user_id, sort, order)
+    if page is not None:
+        query = query.offset((page - 1) * per_page).limit(per_page)
+    return [{
+        "id": row.id,
+        "name": row.name,
+        "amount": row.amount,
+        "price": row.price,
+        "is_active": row.is_active,
+        "is_expired": row.is_expired,
+        "creator": {
+            "id": row.creator_id,
+            "username": row.username,
+            "email": row.email
+        } if row.creator_id is not None else None
+    } for row in query]
 
 @buyer_bp.route('/api/buyer/generate-certificate/<int:creditId>', methods=['GET'])
 @jwt_required()
@@ -206,7 +296,7 @@ def generate_certificate(creditId):
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
     
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     purchased_credit = PurchasedCredit.query.filter_by(credit_id=creditId, user_id=user.id).first()
     if not purchased_credit:
         return jsonify({"message": f"Credit with {creditId} was never purchased"}), 404
@@ -233,7 +323,7 @@ def download_certificate(creditId):
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
     
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     purchased_credit = PurchasedCredit.query.filter_by(credit_id=creditId, user_id=user.id).first()
     if not purchased_credit:
         return jsonify({"message": f"Credit with {creditId} was never purchased"}), 404
@@ -249,7 +339,19 @@ def download_certificate(creditId):
     if certificate_data is None:
         return jsonify({"message":f"No credit with {credit.id} has expired"}), 404
     
-    # Return HTML certificate only since WeasyPrint is not available
+    if request.args.get('format') == 'pdf' and pdf_enabled():
+        encoded = request_pdf(certificate_data, certificate_digest(purchased_credit.id, transaction.txn_hash))
+        if encoded is None:
+            # Rendering happens in the PDF pool, the client polls until it is ready
+            return jsonify({"status": "rendering", "message": "Certificate PDF is being generated, retry shortly"}), 202
+        return jsonify({
+            "filename": f"Hydrogen_Credit_Certificate_{purchased_credit.id}.pdf",
+            "pdf": encoded,
+            "certificate_id": certificate_data['certificate_id'],
+            "transaction_hash": certificate_data['transaction_hash']
+        })
+
+    # HTML certificate when PDF rendering is not enabled
     return jsonify({
         "filename": f"Hydrogen_Credit_Certificate_{purchased_credit.id}.html",
         "html": certificate_data['certificate_html'],
@@ -297,39 +399,52 @@ def get_credit_details(credit_id):
 # 🚀 NEW ENHANCED API ENDPOINTS
 @buyer_bp.route('/api/buyer/portfolio-analytics', methods=['GET'])
 @jwt_required()
+@read_only
 def get_portfolio_analytics():
     current_user = get_current_user()
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
-    purchased_credits = PurchasedCredit.query.filter_by(user_id=user.id).all()
-    
-    total_invested = 0
-    current_value = 0
-            hydrogen_offset = 0
-    credits_count = len(purchased_credits)
-    
-    for pc in purchased_credits:
-        credit = Credit.query.get(pc.credit_id)
-        if credit:
-            total_invested += float(credit.price)
-            # Mock performance calculation
-            performance = (hash(str(credit.id)) % 100) - 50  # Random performance between -50 and 50
-            current_value += float(credit.price) * (1 + performance / 100)
-            hydrogen_offset += float(credit.amount) * 0.5  # Mock H₂ production impact
-    
+    user = identity.current_user()
+    summary = portfolio_summary(user.id)
+    return jsonify(_portfolio_payload(summary))
+
+def _portfolio_payload(totals):
+    total_invested = float(totals['total_invested'])
+    current_value = float(totals['current_value'])
     profit_loss = current_value - total_invested
     profit_loss_percentage = (profit_loss / total_invested * 100) if total_invested > 0 else 0
-    
-    return jsonify({
+    return {
         "totalInvested": round(total_invested, 2),
         "currentValue": round(current_value, 2),
         "profitLoss": round(profit_loss, 2),
         "profitLossPercentage": round(profit_loss_percentage, 2),
-                    "hydrogenOffset": round(hydrogen_offset, 1),
-        "creditsCount": credits_count
-    })
+        "hydrogenOffset": round(float(totals['hydrogen_offset']), 1),
+        "creditsCount": int(totals['credits_count']),
+        "expiredCount": int(totals['expired_count'])
+    }
+
+@buyer_bp.route('/api/buyer/portfolio-history', methods=['GET'])
+@jwt_required()
+@read_only
+def get_portfolio_history():
+    """Portfolio totals over time. Query params: bucket=day|month, from / to (ISO dates)"""
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({"message": "Invalid token"}), 401
+
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in ('day', 'month'):
+        return jsonify({"message": "bucket must be day or month"}), 400
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"message": "from / to must be ISO dates (YYYY-MM-DD)"}), 400
+
+    user = identity.current_user()
+    series = portfolio_history(user.id, bucket=bucket, start=start, end=end)
+    return jsonify([{"period": period, **_portfolio_payload(totals)} for period, totals in series])
 
 @buyer_bp.route('/api/buyer/market-trends', methods=['GET'])
 @jwt_required()
@@ -343,42 +458,20 @@ def get_market_trends():
     ]
     return jsonify(trends)
 
+MAX_RECOMMENDATIONS = 50
+
 @buyer_bp.route('/api/buyer/recommendations', methods=['GET'])
 @jwt_required()
+@read_only
 def get_recommendations():
     current_user = get_current_user()
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
-    purchased_credits = PurchasedCredit.query.filter_by(user_id=user.id).all()
-    purchased_credit_ids = [pc.credit_id for pc in purchased_credits]
-    
-    # Get available credits that user hasn't purchased
-    available_credits = Credit.query.filter(
-        Credit.is_active == True,
-        ~Credit.id.in_(purchased_credit_ids)
-    ).limit(5).all()
-    
-    recommendations = []
-    for credit in available_credits:
-        creator = User.query.get(credit.creator_id)
-        recommendations.append({
-            "id": credit.id,
-            "name": credit.name,
-            "amount": credit.amount,
-            "price": credit.price,
-            "creator": {
-                "id": creator.id,
-                "username": creator.username,
-                "email": creator.email
-            } if creator else None,
-            "score": (hash(str(credit.id)) % 100),  # Mock score
-                            "reason": ["High hydrogen impact", "Trending", "Best value", "Popular choice"][hash(str(credit.id)) % 4]
-        })
-    
-    # Sort by score
-    recommendations.sort(key=lambda x: x['score'], reverse=True)
+    limit = max(1, min(request.args.get('limit', 5, type=int), MAX_RECOMMENDATIONS))
+    user = identity.current_user()
+    recommendations = get_or_set(f"recommendations:{user.id}:{limit}", lambda: recommend(user.id, limit),
+                                 tags=["market", f"purchased:{user.id}"])
     return jsonify(recommendations)
 
 @buyer_bp.route('/api/buyer/notifications', methods=['GET'])
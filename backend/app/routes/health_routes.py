@@ -1,4 +1,6 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
+from app.utilis.cache import cache_stats
+from app.utilis import instrumentation
 
 health_bp = Blueprint('health', __name__)
 
@@ -13,3 +15,19 @@ def send_healthz():
 @health_bp.route('/api/health', methods = ["GET"])
 def send_health():
     return jsonify({'status':'Up'}), 200
+
+@health_bp.route('/api/health/cache', methods = ["GET"])
+def send_cache_stats():
+    return jsonify(cache_stats()), 200
+
+@health_bp.route('/api/metrics', methods = ["GET"])
+def send_metrics():
+    if not instrumentation.enabled():
+        return jsonify({'message': 'Instrumentation is disabled'}), 404
+    stats = cache_stats()
+    counters = {
+        'h2cc_cache_hits_total': stats['hits'],
+        'h2cc_cache_misses_total': stats['misses'],
+        'h2cc_cache_errors_total': stats['errors'],
+    }
+    return Response(instrumentation.render_prometheus(counters), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,37 @@
+from flask import Blueprint, Response, current_app, jsonify
+from flask_jwt_extended import jwt_required
+from app.utilis.events import subscribe, unsubscribe, format_sse
+from app.utilis import identity
+from app.utilis.identity import get_current_user
+
+stream_bp = Blueprint('stream', __name__)
+
+# EventSource cannot send headers, so the token may also come as ?jwt=<token>
+@stream_bp.route('/api/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream():
+    """Server-sent credit, audit and verification events for the current user"""
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({"message": "Invalid token"}), 401
+    user = identity.current_user()
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    heartbeat = current_app.config.get('EVENT_HEARTBEAT', 15)
+    subscription = subscribe(user.id, user.role)
+
+    # Runs after the request context is gone, so it holds no DB connection
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                yield format_sse(event) if event is not None else ": keep-alive\n\n"
+        finally:
+            unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Keep nginx from buffering the stream
+    })
@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_current_user
+from flask_jwt_extended import jwt_required
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from app.models.verification import VerificationRequest, VerificationDocument, AuditorVerification
-from app.models.user import User
 from app.models.credit import Credit
-from app.ml_models.h2_verification_model import advanced_h2_model
+from app.ml_models.h2_verification_model import get_h2_model
+from app.ml_models.result_store import store_result, load_results, schedule_backfill
+from app.ml_models.duplicates import claim_features, find_duplicates, index_claim, duplicate_summary, load_flags
+from app.utilis.instrumentation import timed
+from app.utilis.events import publish
+from app.utilis import identity
+from app.utilis.identity import get_current_user
 from app import db
 from datetime import datetime
 import json
@@ -11,6 +18,16 @@ import os
 
 verification_bp = Blueprint('verification', __name__)
 
+def document_counts(verification_ids):
+    """Map verification request id -> number of documents, in one query"""
+    if not verification_ids:
+        return {}
+    rows = (db.session.query(VerificationDocument.verification_request_id, func.count(VerificationDocument.id))
+            .filter(VerificationDocument.verification_request_id.in_(verification_ids))
+            .group_by(VerificationDocument.verification_request_id)
+            .all())
+    return dict(rows)
+
 @verification_bp.route('/api/verification/submit', methods=['POST'])
 @jwt_required()
 def submit_verification():
@@ -19,7 +36,7 @@ def submit_verification():
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     if user.role != 'NGO':
         return jsonify({"message": "Only NGOs can submit verifications"}), 403
 
@@ -32,14 +49,15 @@ def submit_verification():
     production_date = data.get('production_date')
     
     # ML Verification
-    ml_result = advanced_h2_model.verify_h2_production(
-        energy_mwh, h2_kg, production_method,
-        location=data.get('location', 'unknown'),
-        timestamp=data.get('production_date'),
-        equipment_specs=data.get('equipment_specs'),
-        weather_data=data.get('weather_data'),
-        historical_data=data.get('historical_data')
-    )
+    with timed('ml'):
+        ml_result = get_h2_model().verify_h2_production(
+            energy_mwh, h2_kg, production_method,
+            location=data.get('location', 'unknown'),
+            timestamp=data.get('production_date'),
+            equipment_specs=data.get('equipment_specs'),
+            weather_data=data.get('weather_data'),
+            historical_data=data.get('historical_data')
+        )
     
     # Create verification request
     verification_request = VerificationRequest(
@@ -49,10 +67,20 @@ def submit_verification():
         production_date=datetime.strptime(production_date, '%Y-%m-%d').date(),
         production_method=production_method,
         energy_source='renewable',
+        energy_source_mwh=energy_mwh,
+        location=data.get('location'),
         status='pending' if ml_result['is_valid'] else 'rejected'
     )
     
     db.session.add(verification_request)
+    db.session.flush()
+    # Flag claims that repeat production already claimed for the same facility
+    features = claim_features(user.id, verification_request.location, verification_request.production_date,
+                              energy_mwh, h2_kg)
+    duplicates = find_duplicates(features, before_id=verification_request.id)
+    index_claim(verification_request.id, features, duplicates)
+    # Keep the score so auditors' pending list never has to recompute it
+    store_result(verification_request.id, ml_result)
     db.session.commit()
     
     # Auto-generate government documents
@@ -63,6 +91,7 @@ def submit_verification():
         "verification_id": verification_request.id,
         "ml_verification": ml_result,
         "documents": documents,
+        "duplicate_check": duplicate_summary(duplicates),
         "status": verification_request.status
     })
 
@@ -75,20 +104,65 @@ def ml_verify():
     h2_kg = float(data.get('h2_kg', 0))
     production_method = data.get('production_method', 'electrolysis')
     
-    result = advanced_h2_model.verify_h2_production(
-        energy_mwh, h2_kg, production_method,
-        location=data.get('location', 'unknown'),
-        timestamp=data.get('timestamp'),
-        equipment_specs=data.get('equipment_specs'),
-        weather_data=data.get('weather_data'),
-        historical_data=data.get('historical_data')
-    )
+    with timed('ml'):
+        result = get_h2_model().verify_h2_production(
+            energy_mwh, h2_kg, production_method,
+            location=data.get('location', 'unknown'),
+            timestamp=data.get('timestamp'),
+            equipment_specs=data.get('equipment_specs'),
+            weather_data=data.get('weather_data'),
+            historical_data=data.get('historical_data')
+        )
     
     return jsonify({
         "ml_verification": result,
         "recommendation": "APPROVED" if result['is_valid'] else "REJECTED"
     })
 
+BATCH_FIELDS = ('energy_mwh', 'h2_kg', 'method', 'timestamp', 'location')
+
+@verification_bp.route('/api/verification/ml-verify-batch', methods=['POST'])
+@jwt_required()
+def ml_verify_batch():
+    """Vectorized ML verification of many production records at once"""
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({"message": "Invalid batch: expected a JSON object"}), 400
+    
+    # Accept either a list of records or columnar arrays
+    records = data.get('records')
+    if records is not None:
+        if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+            return jsonify({"message": "Invalid batch: records must be a list of objects"}), 400
+        columns = {field: [r.get(field, r.get('production_method')) if field == 'method' else r.get(field)
+                           for r in records]
+                   for field in BATCH_FIELDS}
+    else:
+        columns = {field: data[field] for field in BATCH_FIELDS if field in data}
+        if 'method' not in columns and 'production_method' in data:
+            columns['method'] = data['production_method']
+    
+    try:
+        with timed('ml'):
+            result = get_h2_model().verify_batch(columns)
+    except (KeyError, ValueError, TypeError) as e:
+        return jsonify({"message": f"Invalid batch: {e}"}), 400
+    
+    fields = [k for k in result if k != 'model_version']
+    values = [result[k].tolist() for k in fields]
+    rows = [dict(zip(fields, row)) for row in zip(*values)]
+    for row in rows:
+        row['recommendation'] = "APPROVED" if row['is_valid'] else "REJECTED"
+    
+    approved = int(result['is_valid'].sum())
+    return jsonify({
+        "model_version": result['model_version'],
+        "count": len(rows),
+        "approved": approved,
+        "rejected": len(rows) - approved,
+        "results": rows
+    })
+
 @verification_bp.route('/api/verification/pending', methods=['GET'])
 @jwt_required()
 def get_pending_verifications():
@@ -97,35 +171,39 @@ def get_pending_verifications():
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     if user.role != 'auditor':
         return jsonify({"message": "Only auditors can view pending verifications"}), 403
 
-    pending_verifications = VerificationRequest.query.filter_by(status='pending').all()
+    pending_verifications = (VerificationRequest.query
+                             .options(joinedload(VerificationRequest.industry))
+                             .filter_by(status='pending')
+                             .all())
+    pending_ids = [v.id for v in pending_verifications]
+    doc_counts = document_counts(pending_ids)
+    ml_results = load_results(pending_ids)
+    duplicate_flags = load_flags(pending_ids)
+    
+    # Rescoring only happens in the background, after a model version change
+    if len(ml_results) < len(pending_ids) or not all(current for _, current in ml_results.values()):
+        schedule_backfill()
     
     verifications = []
     for v in pending_verifications:
-        industry = User.query.get(v.industry_id)
-        documents = VerificationDocument.query.filter_by(verification_request_id=v.id).all()
-        
-        # Re-run ML verification
-        ml_result = advanced_h2_model.verify_h2_production(
-            v.energy_source_mwh if hasattr(v, 'energy_source_mwh') else 1000,
-            v.hydrogen_amount,
-            v.production_method,
-            location='unknown',
-            timestamp=v.created_at.isoformat() if v.created_at else None
-        )
-        
+        ml_result, is_current = ml_results.get(v.id, (None, False))
+        duplicate_of, duplicate_match = duplicate_flags.get(v.id, (None, None))
         verifications.append({
             "id": v.id,
-            "industry_name": industry.username,
+            "industry_name": v.industry.username,
             "hydrogen_amount": v.hydrogen_amount,
             "production_method": v.production_method,
             "production_date": v.production_date.strftime('%Y-%m-%d'),
             "created_at": v.created_at.strftime('%Y-%m-%d %H:%M'),
-            "documents_count": len(documents),
-            "ml_verification": ml_result
+            "documents_count": doc_counts.get(v.id, 0),
+            "ml_verification": ml_result,
+            "ml_stale": not is_current,
+            "duplicate_of": duplicate_of,
+            "duplicate_match": duplicate_match
         })
     
     return jsonify(verifications)
@@ -138,7 +216,7 @@ def approve_verification(verification_id):
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     if user.role != 'auditor':
         return jsonify({"message": "Only auditors can approve verifications"}), 403
 
@@ -171,22 +249,26 @@ def approve_verification(verification_id):
     verification.verification_date = datetime.utcnow()
     verification.verification_notes = notes
     
-    # Generate credit
+    # Generate credit (already audited through the verification, so req_status 2)
     credit = Credit(
         name=f"H₂ Credit - {verification.production_method}",
-        description=f"Verified H₂ production using {verification.production_method}",
-        amount=verification.hydrogen_amount,
+        amount=int(verification.hydrogen_amount),
         price=verification.hydrogen_amount * 2.5,  # $2.5 per kg H₂
         creator_id=verification.industry_id,
-        is_verified=True
+        req_status=2
     )
     
     db.session.add(credit)
-    db.session.commit()
+    db.session.flush()
     
     # Link credit to verification
     verification.credit_id = credit.id
     db.session.commit()
+    publish('verification.approved', {
+        "verification_id": verification_id,
+        "status": verification.status,
+        "credit_id": credit.id
+    }, users=[verification.industry_id])
     
     return jsonify({
         "message": "Verification approved and credits generated",
@@ -203,7 +285,7 @@ def reject_verification(verification_id):
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     if user.role != 'auditor':
         return jsonify({"message": "Only auditors can reject verifications"}), 403
 
@@ -220,6 +302,10 @@ def reject_verification(verification_id):
     verification.verification_notes = notes
     
     db.session.commit()
+    publish('verification.rejected', {
+        "verification_id": verification_id,
+        "status": verification.status
+    }, users=[verification.industry_id])
     
     return jsonify({
         "message": "Verification rejected",
@@ -234,23 +320,22 @@ def get_industry_verification_status():
     if not current_user:
         return jsonify({"message": "Invalid token"}), 401
 
-    user = User.query.filter_by(username=current_user['username']).first()
+    user = identity.current_user()
     if user.role != 'NGO':
         return jsonify({"message": "Only NGOs can view their verification status"}), 403
 
     verifications = VerificationRequest.query.filter_by(industry_id=user.id).all()
+    doc_counts = document_counts([v.id for v in verifications])
     
     status_list = []
     for v in verifications:
-        documents = VerificationDocument.query.filter_by(verification_request_id=v.id).all()
-        
         status_list.append({
             "id": v.id,
             "hydrogen_amount": v.hydrogen_amount,
             "production_method": v.production_method,
             "status": v.status,
             "created_at": v.created_at.strftime('%Y-%m-%d %H:%M'),
-            "documents_count": len(documents),
+            "documents_count": doc_counts.get(v.id, 0),
             "credit_id": v.credit_id
         })
     
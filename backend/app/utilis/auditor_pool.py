@@ -0,0 +1,107 @@
+"""
+Auditor selection for new credits.
+
+Assignments are load balanced: auditors with the fewest open (not yet voted)
+assignments are preferred, ties are broken randomly.
+
+``auditor_pool`` keeps the auditor ids and their open workload in memory, so
+capacity checks and sampling do not query the users table. It reloads after
+a commit in this worker changes users, and every AUDITOR_POOL_TTL seconds to
+pick up signups, votes and assignments handled by other workers.
+"""
+import heapq
+import random
+import threading
+import time
+from flask import current_app
+from sqlalchemy import and_, func
+from app import db
+from app.models.user import User
+from app.models.association import AuditorAssociation
+from app.utilis.cache import on_invalidate
+
+def load_auditor_workload():
+    """Map every auditor id to its number of open assignments, in one query"""
+    rows = (db.session.query(User.id, func.count(AuditorAssociation.credit_id))
+            .outerjoin(AuditorAssociation, and_(AuditorAssociation.auditor_id == User.id,
+                                                AuditorAssociation.pending.is_(True)))
+            .filter(User.role == 'auditor')
+            .group_by(User.id)
+            .all())
+    return dict(rows)
+
+def sample_least_loaded(workload, k, rng=random):
+    """Pick k distinct auditors with the lightest workload.
+
+    ``workload`` is updated in place so consecutive calls spread a batch
+    across the pool. Raises ValueError if fewer than k auditors exist.
+    """
+    if k > len(workload):
+        raise ValueError(f"Need {k} auditors, only {len(workload)} available")
+    chosen = heapq.nsmallest(k, workload, key=lambda auditor_id: (workload[auditor_id], rng.random()))
+    for auditor_id in chosen:
+        workload[auditor_id] += 1
+    return chosen
+
+class AuditorPool:
+    def __init__(self):
+        self._workload = {}
+        self._loaded_at = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def _current(self):
+        ttl = current_app.config.get('AUDITOR_POOL_TTL', 30)
+        if self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+            with self._lock:
+                if self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+                    self._stale = False
+                    self._workload = load_auditor_workload()
+                    self._loaded_at = time.monotonic()
+        return self._workload
+
+    def mark_stale(self):
+        self._stale = True
+
+    def count(self):
+        return len(self._current())
+
+    def has_capacity(self, k):
+        return k <= len(self._current())
+
+    def workload(self):
+        """A copy of auditor id -> open assignments, e.g. for sample_least_loaded"""
+        workload = self._current()
+        with self._lock:
+            return dict(workload)
+
+    def sample(self, k, rng=random):
+        """Pick k distinct auditors, weighted towards the least loaded.
+
+        Weighted sampling without replacement (Efraimidis-Spirakis) with
+        weight 1 / (1 + open assignments). Raises ValueError if fewer than k
+        auditors exist. The workload is not changed; call record_assignments()
+        once the assignment is committed.
+        """
+        workload = self.workload()
+        if k > len(workload):
+            raise ValueError(f"Need {k} auditors, only {len(workload)} available")
+        return heapq.nlargest(k, workload, key=lambda auditor_id: rng.random() ** (1 + workload[auditor_id]))
+
+    def record_assignments(self, auditor_ids):
+        with self._lock:
+            for auditor_id in auditor_ids:
+                if auditor_id in self._workload:
+                    self._workload[auditor_id] += 1
+
+    def record_vote(self, auditor_id):
+        with self._lock:
+            if self._workload.get(auditor_id, 0) > 0:
+                self._workload[auditor_id] -= 1
+
+auditor_pool = AuditorPool()
+
+@on_invalidate
+def _reload_on_user_change(tags):
+    if 'users' in tags:
+        auditor_pool.mark_stale()
@@ -0,0 +1,351 @@
+"""
+Central JSON cache on top of the Redis client.
+
+Keys are namespaced and versioned (``<namespace>:v<version>:<name>``) and every
+entry is bound to the current version of its tags. Invalidating a tag bumps its
+version, so entries written before the change are never read again and simply
+age out with their TTL. Tag versions are bumped from SQLAlchemy session events
+after a successful commit, using the tags each model reports through
+``cache_tags()``; routes never delete keys by hand.
+
+Large, hot listings go through get_listing(), which stores them as page
+shards and coalesces recomputation: one worker rebuilds behind a lock while
+the others serve the previous version, and entries past their soft TTL are
+refreshed in the background.
+
+Loaders that fill the cache always query the primary, even in a ``read_only``
+view: a lagging replica read stored under the freshly bumped tag versions
+would be served as current until its TTL.
+
+Every call degrades to a plain loader call when Redis is absent or failing.
+"""
+import json
+import threading
+from collections import namedtuple
+import time
+import uuid
+from flask import current_app
+from redis.exceptions import RedisError
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.utilis.redis import get_redis
+from app.utilis.db_routing import on_primary
+from app.utilis.instrumentation import record_redis
+
+_settings = {
+    'namespace': 'h2cc',
+    'version': '1',
+    'default_ttl': 300,
+    'lock_timeout': 5,
+}
+
+# Called with the set of tags after each commit that invalidated any, even
+# without Redis, for in-process state derived from the same data
+_invalidation_listeners = []
+
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'bypassed': 0,
+    'errors': 0,
+    'invalidations': 0,
+    'stale': 0,
+    'refreshes': 0,
+}
+
+def init_cache(app):
+    _settings['namespace'] = app.config.get('CACHE_NAMESPACE', _settings['namespace'])
+    _settings['version'] = str(app.config.get('CACHE_VERSION', _settings['version']))
+    _settings['default_ttl'] = int(app.config.get('CACHE_DEFAULT_TTL', _settings['default_ttl']))
+    _settings['lock_timeout'] = float(app.config.get('CACHE_LOCK_TIMEOUT', _settings['lock_timeout']))
+    if not event.contains(Session, 'after_flush', _collect_tags):
+        event.listen(Session, 'after_flush', _collect_tags)
+        event.listen(Session, 'after_commit', _invalidate_collected_tags)
+        event.listen(Session, 'after_soft_rollback', _discard_collected_tags)
+
+def make_key(*parts):
+    return ':'.join([_settings['namespace'], 'v' + _settings['version'], *(str(p) for p in parts)])
+
+def _tag_key(tag):
+    return make_key('tag', tag)
+
+def _versioned_key(client, name, tags):
+    if not tags:
+        return make_key(name)
+    record_redis()
+    versions = client.mget([_tag_key(t) for t in tags])
+    return make_key(name) + '@' + '.'.join(v or '0' for v in versions)
+
+def _record_error(e):
+    _stats['errors'] += 1
+    print(f"redis cache error: {e}")
+
+def get_or_set(name, loader, tags=(), ttl=None):
+    """Return the cached JSON value for ``name`` or compute it with ``loader``.
+
+    ``tags`` are the invalidation tags the value depends on; the value must be
+    JSON serializable.
+    """
+    client = get_redis()
+    if client is None:
+        _stats['bypassed'] += 1
+        return loader()
+
+    tags = sorted(tags)
+    try:
+        key = _versioned_key(client, name, tags)
+        record_redis()
+        cached = client.get(key)
+    except RedisError as e:
+        _record_error(e)
+        return loader()
+
+    if cached is not None:
+        _stats['hits'] += 1
+        return json.loads(cached)
+
+    _stats['misses'] += 1
+    with on_primary():
+        value = loader()
+    try:
+        # Keyed on the tag versions read *before* loading, so a write that
+        # commits while we load makes this entry unreachable instead of stale
+        record_redis()
+        client.set(key, json.dumps(value), ex=ttl or _settings['default_ttl'])
+    except RedisError as e:
+        _record_error(e)
+    return value
+
+def get(name):
+    """Read an untagged value stored with put(), None on a miss"""
+    client = get_redis()
+    if client is None:
+        _stats['bypassed'] += 1
+        return None
+    try:
+        record_redis()
+        cached = client.get(make_key(name))
+    except RedisError as e:
+        _record_error(e)
+        return None
+    _stats['hits' if cached is not None else 'misses'] += 1
+    return json.loads(cached) if cached is not None else None
+
+def put(name, value, ttl=None):
+    """Store an untagged JSON value, for immutable or content-addressed data"""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        record_redis()
+        client.set(make_key(name), json.dumps(value), ex=ttl or _settings['default_ttl'])
+    except RedisError as e:
+        _record_error(e)
+
+Listing = namedtuple('Listing', 'items pages version written_at')
+
+def _page_slice(items, page, page_size, version=None):
+    pages = -(-len(items) // page_size)
+    if page is not None:
+        items = items[(page - 1) * page_size:page * page_size]
+    return Listing(items, pages, version, time.time())
+
+def _load_listing(loader, version_of):
+    # Version first: the data is then at least as new as the version it reports
+    version = version_of() if version_of else None
+    return loader(), version
+
+def _read_listing(client, base, page):
+    """The cached listing (or one page of it), None if missing or incomplete"""
+    if page is None:
+        record_redis()
+        meta = client.get(base + '#meta')
+        if meta is None:
+            return None
+        meta = json.loads(meta)
+        record_redis()
+        shards = client.mget([f'{base}#{i}' for i in range(1, meta['pages'] + 1)]) if meta['pages'] else []
+    else:
+        record_redis()
+        meta, shard = client.mget([base + '#meta', f'{base}#{page}'])
+        if meta is None:
+            return None
+        meta = json.loads(meta)
+        shards = [shard] if page <= meta['pages'] else []
+    if any(shard is None for shard in shards):
+        return None
+    items = [item for shard in shards for item in json.loads(shard)]
+    return Listing(items, meta['pages'], meta.get('version'), meta['at'])
+
+def _write_listing(client, name, base, items, version, page_size, ttl):
+    pages = -(-len(items) // page_size)
+    pipe = client.pipeline(transaction=False)
+    pipe.set(base + '#meta', json.dumps({'at': time.time(), 'pages': pages, 'version': version}), ex=ttl)
+    for i in range(pages):
+        pipe.set(f'{base}#{i + 1}', json.dumps(items[i * page_size:(i + 1) * page_size]), ex=ttl)
+    # Where to find the last complete listing once tags move on
+    pipe.set(make_key(name, 'latest'), base, ex=ttl)
+    record_redis()
+    pipe.execute()
+
+def _acquire_lock(client, name):
+    token = uuid.uuid4().hex
+    record_redis()
+    if client.set(make_key(name, 'lock'), token, nx=True, ex=max(1, int(_settings['lock_timeout']))):
+        return token
+    return None
+
+def _release_lock(client, name, token):
+    lock = make_key(name, 'lock')
+    record_redis()
+    if client.get(lock) == token:
+        client.delete(lock)
+
+def _rebuild_listing(client, name, base, loader, version_of, page_size, ttl, token):
+    try:
+        with on_primary():
+            items, version = _load_listing(loader, version_of)
+        _write_listing(client, name, base, items, version, page_size, ttl)
+        return items, version
+    finally:
+        _release_lock(client, name, token)
+
+def _refresh_in_background(client, name, base, loader, version_of, page_size, ttl, token):
+    app = current_app._get_current_object()
+
+    def refresh():
+        with app.app_context():
+            try:
+                _rebuild_listing(client, name, base, loader, version_of, page_size, ttl, token)
+                _stats['refreshes'] += 1
+            except RedisError as e:
+                _record_error(e)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+def get_listing(name, loader, tags=(), page=None, page_size=100, soft_ttl=30, ttl=None, version_of=None):
+    """Return a ``Listing`` for the list computed by ``loader``.
+
+    The list is cached as ``page_size`` shards, so ``page`` (1-based) reads a
+    single shard. Only the worker holding the rebuild lock runs ``loader``
+    after an invalidation; the others serve the previous listing, or wait
+    for the rebuild when there is none. Entries older than ``soft_ttl``
+    seconds are still served while one worker refreshes them in the background.
+
+    ``version_of`` is called just before ``loader`` and its result is kept
+    with the data, so ``Listing.version`` describes what is actually served,
+    including a stale copy.
+    """
+    client = get_redis()
+    if client is None:
+        _stats['bypassed'] += 1
+        items, version = _load_listing(loader, version_of)
+        return _page_slice(items, page, page_size, version)
+
+    ttl = ttl or _settings['default_ttl']
+    tags = sorted(tags)
+    try:
+        base = _versioned_key(client, name, tags)
+        listing = _read_listing(client, base, page)
+        if listing is not None:
+            _stats['hits'] += 1
+            if time.time() - listing.written_at > soft_ttl:
+                token = _acquire_lock(client, name)
+                if token:
+                    _refresh_in_background(client, name, base, loader, version_of, page_size, ttl, token)
+            return listing
+
+        _stats['misses'] += 1
+        token = _acquire_lock(client, name)
+        if token:
+            items, version = _rebuild_listing(client, name, base, loader, version_of, page_size, ttl, token)
+            return _page_slice(items, page, page_size, version)
+
+        # Another worker is rebuilding: serve the previous listing meanwhile
+        record_redis()
+        latest = client.get(make_key(name, 'latest'))
+        listing = _read_listing(client, latest, page) if latest else None
+        if listing is not None:
+            _stats['stale'] += 1
+            return listing
+        deadline = time.monotonic() + _settings['lock_timeout']
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            listing = _read_listing(client, base, page)
+            if listing is not None:
+                return listing
+    except RedisError as e:
+        _record_error(e)
+    items, version = _load_listing(loader, version_of)
+    return _page_slice(items, page, page_size, version)
+
+def invalidate_tags(*tags):
+    client = get_redis()
+    if client is None or not tags:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for tag in set(tags):
+            pipe.incr(_tag_key(tag))
+        record_redis()
+        pipe.execute()
+        _stats['invalidations'] += len(set(tags))
+    except RedisError as e:
+        _record_error(e)
+
+def on_invalidate(listener):
+    """Register ``listener(tags)`` to run after a commit invalidates ``tags``"""
+    if listener not in _invalidation_listeners:
+        _invalidation_listeners.append(listener)
+    return listener
+
+def tag_session(session, *tags):
+    """Invalidate ``tags`` when ``session`` commits.
+
+    For writes that bypass the unit of work (bulk inserts, Core/ORM-enabled
+    UPDATE statements) and are therefore invisible to the flush listener.
+    """
+    session.info.setdefault('cache_tags', set()).update(tags)
+
+def cache_stats():
+    lookups = _stats['hits'] + _stats['misses']
+    return {
+        **_stats,
+        'enabled': get_redis() is not None,
+        'hit_ratio': round(_stats['hits'] / lookups, 4) if lookups else 0.0,
+    }
+
+def _collect_tags(session, flush_context):
+    from app.models.credit import Credit
+    from app.models.transaction import PurchasedCredit
+
+    tags = set()
+    changed_credit_ids = []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        cache_tags = getattr(obj, 'cache_tags', None)
+        if cache_tags is None:
+            continue
+        tags.update(cache_tags())
+        if isinstance(obj, Credit) and obj.id is not None:
+            changed_credit_ids.append(obj.id)
+
+    if changed_credit_ids:
+        # Holders see the credit's price/status in their purchased listing
+        holders = session.connection().execute(
+            select(PurchasedCredit.user_id).where(PurchasedCredit.credit_id.in_(changed_credit_ids))
+        ).scalars()
+        tags.update(f'purchased:{user_id}' for user_id in holders)
+
+    if tags:
+        tag_session(session, *tags)
+
+def _invalidate_collected_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate_tags(*tags)
+        for listener in _invalidation_listeners:
+            listener(tags)
+
+def _discard_collected_tags(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('cache_tags', None)
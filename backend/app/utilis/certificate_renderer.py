@@ -0,0 +1,143 @@
+"""
+Certificate rendering.
+
+The HTML template is compiled once at import. Rendered certificates are
+content-addressed by (template version, purchase id, transaction hash): a
+certificate only exists once its credit has expired and never changes after
+that, so renders are kept in a small in-process LRU backed by the shared cache.
+
+PDFs are rendered with WeasyPrint in an optional process pool
+(CERTIFICATE_PDF_WORKERS > 0). The web worker only submits the job and answers
+from the cache once it is done, it never waits on a render.
+"""
+import base64
+import hashlib
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from app.utilis import cache
+
+# Bump when the template changes so old content addresses are not reused
+TEMPLATE_VERSION = '1'
+CERTIFICATE_TTL = 7 * 24 * 3600
+LOGO_URL = "https://i.ibb.co/TDn711NW/leaf-8993153.png"
+
+_env = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates')),
+    autoescape=select_autoescape(['html'])
+)
+_template = _env.get_template('certificate.html')
+
+_local_cache = OrderedDict()
+_local_cache_size = 256
+_local_lock = threading.Lock()
+
+_pdf_pool = None
+_pdf_broken = False  # Set once WeasyPrint turns out to be unusable (e.g. missing GTK)
+_pdf_jobs = {}
+_pdf_lock = threading.Lock()
+
+def init_certificates(app):
+    global _pdf_pool, _local_cache_size
+    _local_cache_size = app.config.get('CERTIFICATE_CACHE_SIZE', _local_cache_size)
+    workers = app.config.get('CERTIFICATE_PDF_WORKERS', 0)
+    if workers and pdf_available():
+        _pdf_pool = ProcessPoolExecutor(max_workers=workers)
+
+def pdf_available():
+    return importlib.util.find_spec('weasyprint') is not None
+
+def pdf_enabled():
+    return _pdf_pool is not None and not _pdf_broken
+
+def certificate_digest(purchase_id, txn_hash, with_logo=False):
+    raw = f"{TEMPLATE_VERSION}|{purchase_id}|{txn_hash}|{int(with_logo)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _local_get(key):
+    with _local_lock:
+        value = _local_cache.get(key)
+        if value is not None:
+            _local_cache.move_to_end(key)
+        return value
+
+def _local_put(key, value):
+    with _local_lock:
+        _local_cache[key] = value
+        _local_cache.move_to_end(key)
+        while len(_local_cache) > _local_cache_size:
+            _local_cache.popitem(last=False)
+
+def _render(purchase_id, user, purchased_credit, credit, transaction, with_logo):
+    return {
+        "certificate_id": f"CC-{purchase_id}-{user.id}-{credit.id-1}",
+        "buyer_name": user.username,
+        "credit_name": credit.name,
+        "amount": purchased_credit.amount,
+        "purchase_date": purchased_credit.purchase_date.strftime("%Y-%m-%d"),
+        "transaction_hash": transaction.txn_hash,
+        "certificate_html": _template.render(
+            buyer_name=user.username,
+            credit_name=credit.name,
+            purchase_date_long=purchased_credit.purchase_date.strftime("%B %d, %Y"),
+            credit_amount=credit.amount,
+            credit_price=credit.price,
+            transaction_hash=transaction.txn_hash,
+            purchase_id=purchase_id,
+            user_id=user.id,
+            credit_id=credit.id,
+            logo_url=LOGO_URL if with_logo else None
+        )
+    }
+
+def render_certificate(purchase_id, user, purchased_credit, credit, transaction, with_logo=False):
+    """Certificate data and HTML, rendered at most once per content address"""
+    digest = certificate_digest(purchase_id, transaction.txn_hash, with_logo)
+    certificate = _local_get(digest)
+    if certificate is None:
+        certificate = cache.get_or_set(
+            f"certificate:{digest}",
+            lambda: _render(purchase_id, user, purchased_credit, credit, transaction, with_logo),
+            ttl=CERTIFICATE_TTL
+        )
+        _local_put(digest, certificate)
+    return certificate
+
+def _html_to_pdf(html):
+    # Runs in a pool process; WeasyPrint is only imported there
+    from weasyprint import HTML
+    return HTML(string=html).write_pdf()
+
+def _pdf_done(digest, future):
+    global _pdf_broken
+    with _pdf_lock:
+        _pdf_jobs.pop(digest, None)
+    error = future.exception()
+    if error is not None:
+        print(f"Certificate PDF render failed: {error}")
+        if isinstance(error, (ImportError, OSError)):
+            _pdf_broken = True
+        return
+    encoded = base64.b64encode(future.result()).decode('ascii')
+    _local_put(f"pdf:{digest}", encoded)
+    cache.put(f"certificate-pdf:{digest}", encoded, ttl=CERTIFICATE_TTL)
+
+def request_pdf(certificate, digest):
+    """Base64 PDF if already rendered, otherwise queue a render and return None"""
+    encoded = _local_get(f"pdf:{digest}")
+    if encoded is None:
+        encoded = cache.get(f"certificate-pdf:{digest}")
+        if encoded is not None:
+            _local_put(f"pdf:{digest}", encoded)
+    if encoded is not None:
+        return encoded
+
+    with _pdf_lock:
+        if digest not in _pdf_jobs:
+            future = _pdf_pool.submit(_html_to_pdf, certificate['certificate_html'])
+            _pdf_jobs[digest] = future
+            future.add_done_callback(lambda f: _pdf_done(digest, f))
+    return None
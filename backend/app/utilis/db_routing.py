@@ -0,0 +1,70 @@
+"""
+Primary / read-replica routing for db.session.
+
+Views decorated with ``read_only`` send their queries to the ``replica`` bind
+(SQLALCHEMY_BINDS, configured from POSTGRES_REPLICA_URI); flushes and
+INSERT/UPDATE/DELETE statements always go to the primary. Without a replica
+everything runs on the primary. Replicas lag, so only use ``read_only`` on
+views where a slightly stale answer is acceptable, and wrap anything whose
+result outlives the request (cache loaders) in ``on_primary()``.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import sqlalchemy as sa
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self._flushing or isinstance(clause, sa.UpdateBase):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if not has_app_context() or not g.get('db_read_only'):
+            return False
+        return REPLICA_BIND in self._db.engines
+
+def read_only(view):
+    """Route the view's queries to the read replica when one is configured"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def on_primary():
+    """Send the block's queries to the primary, also inside a ``read_only`` view"""
+    if not has_app_context():
+        yield
+        return
+    previous = g.get('db_read_only', False)
+    g.db_read_only = False
+    try:
+        yield
+    finally:
+        g.db_read_only = previous
+
+def init_db_routing(app, db):
+    timeout = int(app.config.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if not timeout:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'postgresql':
+                # SET on connect rather than a startup option, which poolers reject
+                sa.event.listen(engine, 'connect', _statement_timeout_setter(timeout))
+
+def _statement_timeout_setter(timeout):
+    def set_statement_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {int(timeout)}")
+        cursor.close()
+    return set_statement_timeout
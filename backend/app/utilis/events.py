@@ -0,0 +1,137 @@
+"""
+Push notifications for /api/stream (server-sent events).
+
+Routes call publish() after committing. Each worker keeps an in-process
+broker of subscriber queues; with Redis enabled, events go through a Redis
+pub/sub channel instead, so subscribers on every worker receive them. An
+event is addressed to everyone (``users`` and ``roles`` both None) or to the
+listed user ids and/or roles.
+
+Events are notifications, not a log: a client that reconnects re-syncs with
+the listing endpoints' ``?since=`` mode.
+"""
+import json
+import queue
+import threading
+import time
+from itertools import count
+from redis import Redis
+from redis.exceptions import RedisError
+from app.utilis.redis import get_redis
+
+_settings = {
+    'channel': 'h2cc:events',
+    'queue_size': 100,
+    'redis_url': None,
+}
+_subscribers = set()
+_lock = threading.Lock()
+_listener = None
+_event_ids = count(1)
+
+class Subscription:
+    def __init__(self, user_id, role):
+        self.user_id = user_id
+        self.role = role
+        self.events = queue.Queue(maxsize=_settings['queue_size'])
+        self.dropped = 0
+
+    def wants(self, event):
+        if event['users'] is None and event['roles'] is None:
+            return True
+        return self.user_id in (event['users'] or ()) or self.role in (event['roles'] or ())
+
+    def deliver(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # A stalled client loses events rather than growing without bound
+            self.dropped += 1
+
+    def get(self, timeout):
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+def init_events(app):
+    _settings['channel'] = f"{app.config.get('CACHE_NAMESPACE', 'h2cc')}:events"
+    _settings['queue_size'] = int(app.config.get('EVENT_QUEUE_SIZE', _settings['queue_size']))
+    _settings['redis_url'] = app.config.get('REDIS_URL')
+
+def subscribe(user_id, role):
+    subscription = Subscription(user_id, role)
+    with _lock:
+        _subscribers.add(subscription)
+    if get_redis() is not None:
+        _ensure_listener()
+    return subscription
+
+def unsubscribe(subscription):
+    with _lock:
+        _subscribers.discard(subscription)
+
+def subscriber_count():
+    return len(_subscribers)
+
+def publish(event_type, data, users=None, roles=None):
+    event = {
+        'type': event_type,
+        'data': data,
+        'users': list(users) if users is not None else None,
+        'roles': list(roles) if roles is not None else None,
+        'at': time.time(),
+    }
+    client = get_redis()
+    if client is not None:
+        try:
+            client.publish(_settings['channel'], json.dumps(event))
+            return
+        except RedisError as e:
+            print(f"event publish via redis failed, delivering locally: {e}")
+    _deliver(event)
+
+def _deliver(event):
+    event['id'] = next(_event_ids)
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscription in subscribers:
+        if subscription.wants(event):
+            subscription.deliver(event)
+
+def _ensure_listener():
+    global _listener
+    with _lock:
+        if _listener is not None and _listener.is_alive():
+            return
+        _listener = threading.Thread(target=_listen, name='event-listener', daemon=True)
+        _listener.start()
+
+def _listen():
+    # Own connection without a read timeout: a pub/sub socket is idle most of the time
+    while True:
+        try:
+            pubsub = Redis.from_url(_settings['redis_url'], decode_responses=True).pubsub(
+                ignore_subscribe_messages=True)
+            pubsub.subscribe(_settings['channel'])
+            for message in pubsub.listen():
+                _deliver(json.loads(message['data']))
+        except (RedisError, OSError, ValueError) as e:
+            print(f"event listener error, reconnecting: {e}")
+            time.sleep(1)
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+def credit_event(credit):
+    return {
+        "id": credit.id,
+        "name": credit.name,
+        "amount": credit.amount,
+        "price": credit.price,
+        "is_active": credit.is_active,
+        "is_expired": credit.is_expired,
+        "creator_id": credit.creator_id,
+        "req_status": credit.req_status,
+        "version": credit.version,
+    }
@@ -0,0 +1,108 @@
+"""
+Who is making the request.
+
+Access tokens carry the JSON identity {"username", "role"} and, since login
+started adding them, ``uid`` and ``role`` claims, so routes get the user id
+without parsing anything else. current_user() resolves the id to a UserRef
+through a small per-worker LRU cache: entries live USER_CACHE_TTL seconds,
+at most USER_CACHE_SIZE are kept, and a commit in this worker that changes
+a user drops its entry (cache tag ``user:<id>``). Tokens issued before the
+claims existed fall back to a lookup by username.
+
+UserRef is a detached snapshot. Routes that need the password hash or want
+to modify the user load the ORM object themselves.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app, g
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from app import db
+from app.models.user import User
+from app.utilis.cache import on_invalidate
+
+UserRef = namedtuple('UserRef', 'id username email role')
+
+class UserCache:
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, ttl):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            ref, stored_at = entry
+            if time.monotonic() - stored_at > ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return ref
+
+    def put(self, ref, max_size):
+        with self._lock:
+            self._entries[ref.id] = (ref, time.monotonic())
+            self._entries.move_to_end(ref.id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+user_cache = UserCache()
+
+def token_claims(user):
+    """Extra access token claims for ``user``, see login"""
+    return {"uid": user.id, "role": user.role}
+
+def remember(user):
+    """Cache ``user`` (an ORM User) as a UserRef and return it"""
+    ref = UserRef(user.id, user.username, user.email, user.role)
+    user_cache.put(ref, current_app.config.get('USER_CACHE_SIZE', 1024))
+    return ref
+
+def get_current_user():
+    """The token identity as a dict, with ``uid`` when the token carries it"""
+    try:
+        identity = json.loads(get_jwt_identity())
+    except (TypeError, json.JSONDecodeError):
+        return None
+    uid = get_jwt().get('uid')
+    if uid is not None:
+        identity['uid'] = uid
+    return identity
+
+def current_user():
+    """UserRef for the request's token, None if the user no longer exists"""
+    if '_current_user' in g:
+        return g._current_user
+    identity = get_current_user()
+    ref = None
+    if identity:
+        uid = identity.get('uid')
+        if uid is not None:
+            ref = user_cache.get(uid, current_app.config.get('USER_CACHE_TTL', 60))
+            if ref is None:
+                user = db.session.get(User, uid)
+                ref = remember(user) if user else None
+        else:
+            user = User.query.filter_by(username=identity.get('username')).first()
+            ref = remember(user) if user else None
+    g._current_user = ref
+    return ref
+
+@on_invalidate
+def _forget_users(tags):
+    for tag in tags:
+        if tag.startswith('user:'):
+            user_cache.discard(int(tag[len('user:'):]))
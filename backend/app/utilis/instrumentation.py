@@ -0,0 +1,179 @@
+"""
+Opt-in request instrumentation (INSTRUMENTATION_ENABLED).
+
+Records per endpoint: wall time, SQL statement count and time (engine cursor
+events), Redis round trips (reported by the cache layer) and time spent in ML
+scoring (``timed('ml')`` blocks). Metrics live in the worker process and are
+served in Prometheus text format at /api/metrics.
+
+With INSTRUMENTATION_DEBUG, a request that runs the same SQL statement
+N_PLUS_ONE_THRESHOLD times or more is logged as a likely N+1 pattern, and every
+response carries X-Query-Count / X-Query-Time headers.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_settings = {
+    'enabled': False,
+    'debug': False,
+    'n_plus_one_threshold': 5,
+}
+_lock = threading.Lock()
+
+def _new_endpoint_metrics():
+    return {
+        'requests': 0,
+        'errors': 0,
+        'duration_sum': 0.0,
+        'duration_buckets': [0] * len(DURATION_BUCKETS),
+        'sql_statements': 0,
+        'sql_seconds': 0.0,
+        'redis_roundtrips': 0,
+        'ml_seconds': 0.0,
+        'n_plus_one': 0,
+    }
+
+_metrics = defaultdict(_new_endpoint_metrics)
+
+def init_instrumentation(app):
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+    _settings['enabled'] = True
+    _settings['debug'] = bool(app.config.get('INSTRUMENTATION_DEBUG'))
+    _settings['n_plus_one_threshold'] = int(app.config.get('N_PLUS_ONE_THRESHOLD', 5))
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+def enabled():
+    return _settings['enabled']
+
+def _current():
+    if not _settings['enabled'] or not has_request_context():
+        return None
+    return g.get('_instrumentation')
+
+def _start_request():
+    g._instrumentation = {
+        'started': time.perf_counter(),
+        'sql_statements': 0,
+        'sql_seconds': 0.0,
+        'redis_roundtrips': 0,
+        'ml_seconds': 0.0,
+        'statements': defaultdict(int) if _settings['debug'] else None,
+    }
+
+def _finish_request(response):
+    current = _current()
+    if current is None:
+        return response
+    duration = time.perf_counter() - current['started']
+    endpoint = request.endpoint or 'unmatched'
+
+    suspects = []
+    if current['statements'] is not None:
+        threshold = _settings['n_plus_one_threshold']
+        suspects = [(count, sql) for sql, count in current['statements'].items() if count >= threshold]
+        for count, sql in suspects:
+            print(f"[N+1] {request.method} {request.path} ({endpoint}) ran {count}x: {' '.join(sql.split())[:200]}")
+        response.headers['X-Query-Count'] = str(current['sql_statements'])
+        response.headers['X-Query-Time'] = f"{current['sql_seconds'] * 1000:.1f}ms"
+
+    with _lock:
+        metrics = _metrics[endpoint]
+        metrics['requests'] += 1
+        if response.status_code >= 500:
+            metrics['errors'] += 1
+        metrics['duration_sum'] += duration
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                metrics['duration_buckets'][i] += 1
+        metrics['sql_statements'] += current['sql_statements']
+        metrics['sql_seconds'] += current['sql_seconds']
+        metrics['redis_roundtrips'] += current['redis_roundtrips']
+        metrics['ml_seconds'] += current['ml_seconds']
+        metrics['n_plus_one'] += 1 if suspects else 0
+    return response
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('_instrumentation_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current()
+    started = conn.info.get('_instrumentation_started')
+    if current is None or not started:
+        return
+    current['sql_statements'] += 1
+    current['sql_seconds'] += time.perf_counter() - started.pop()
+    if current['statements'] is not None:
+        current['statements'][statement] += 1
+
+def record_redis(roundtrips=1):
+    current = _current()
+    if current is not None:
+        current['redis_roundtrips'] += roundtrips
+
+@contextmanager
+def timed(section):
+    """Add the time spent in the block to ``<section>_seconds`` of the current request"""
+    current = _current()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current[f'{section}_seconds'] += time.perf_counter() - started
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def render_prometheus(extra_counters=None):
+    """Metrics in the Prometheus text exposition format"""
+    with _lock:
+        snapshot = {endpoint: {**m, 'duration_buckets': list(m['duration_buckets'])}
+                    for endpoint, m in _metrics.items()}
+
+    lines = [
+        '# HELP h2cc_request_duration_seconds Request wall time',
+        '# TYPE h2cc_request_duration_seconds histogram',
+    ]
+    for endpoint, m in sorted(snapshot.items()):
+        label = f'endpoint="{_label(endpoint)}"'
+        for bound, count in zip(DURATION_BUCKETS, m['duration_buckets']):
+            lines.append(f'h2cc_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'h2cc_request_duration_seconds_bucket{{{label},le="+Inf"}} {m["requests"]}')
+        lines.append(f'h2cc_request_duration_seconds_sum{{{label}}} {m["duration_sum"]:.6f}')
+        lines.append(f'h2cc_request_duration_seconds_count{{{label}}} {m["requests"]}')
+
+    counters = (
+        ('h2cc_request_errors_total', 'errors', 'Responses with a 5xx status'),
+        ('h2cc_sql_statements_total', 'sql_statements', 'SQL statements executed'),
+        ('h2cc_sql_duration_seconds_total', 'sql_seconds', 'Time spent executing SQL'),
+        ('h2cc_redis_roundtrips_total', 'redis_roundtrips', 'Redis round trips'),
+        ('h2cc_ml_duration_seconds_total', 'ml_seconds', 'Time spent in ML scoring'),
+        ('h2cc_n_plus_one_total', 'n_plus_one', 'Requests flagged with a repeated statement (debug mode)'),
+    )
+    for name, field, help_text in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, m in sorted(snapshot.items()):
+            value = m[field]
+            value = f'{value:.6f}' if isinstance(value, float) else value
+            lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {value}')
+
+    for name, value in (extra_counters or {}).items():
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
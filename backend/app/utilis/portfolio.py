@@ -0,0 +1,171 @@
+"""
+Buyer portfolio rollup.
+
+BuyerPortfolioSummary keeps each buyer's running totals and BuyerPortfolioDaily
+the per-day changes, so the analytics dashboard and its history are plain
+reads. The purchase and expire endpoints apply deltas with
+``UPDATE ... SET x = x + delta`` in their own transaction; call the record_*
+helpers *before* changing the holdings so a buyer without a summary row yet is
+seeded from the GROUP BY aggregate of the state the delta applies to.
+
+Missing summary and daily rows are created with ``INSERT ... ON CONFLICT DO
+NOTHING``, so two requests creating the same row do not fail on the primary
+key: the second one waits for the first and then only applies its delta.
+"""
+from datetime import date, datetime
+from sqlalchemy import case, func, update
+from app import db
+from app.models.credit import Credit
+from app.models.transaction import PurchasedCredit
+from app.models.portfolio import BuyerPortfolioSummary, BuyerPortfolioDaily
+from app.utilis.upsert import insert_missing
+
+HYDROGEN_OFFSET_PER_UNIT = 0.5  # Mock H₂ production impact per credit unit
+TOTAL_FIELDS = ('credits_count', 'expired_count', 'total_invested', 'current_value', 'hydrogen_offset')
+# Summary column -> matching BuyerPortfolioDaily column
+DELTA_FIELDS = {
+    'credits_count': 'credits_delta',
+    'expired_count': 'expired_delta',
+    'total_invested': 'invested_delta',
+    'current_value': 'value_delta',
+    'hydrogen_offset': 'offset_delta',
+}
+
+def mock_performance(credit_id):
+    """Deterministic stand-in for market performance, -50..49 percent"""
+    return (credit_id % 100) - 50
+
+def _empty_totals():
+    return {field: 0 for field in TOTAL_FIELDS}
+
+def _holding_totals(credit, price, sign=1):
+    return {
+        'credits_count': sign,
+        'expired_count': 0,
+        'total_invested': sign * price,
+        'current_value': sign * price * (1 + mock_performance(credit.id) / 100),
+        'hydrogen_offset': sign * credit.amount * HYDROGEN_OFFSET_PER_UNIT,
+    }
+
+def _aggregate_columns():
+    price = func.coalesce(PurchasedCredit.purchase_price, Credit.price)
+    performance = (Credit.id % 100) - 50
+    return (
+        func.count(PurchasedCredit.id).label('credits_count'),
+        func.sum(case((PurchasedCredit.is_expired == True, 1), else_=0)).label('expired_count'),
+        func.sum(price).label('total_invested'),
+        func.sum(price * (1 + performance / 100.0)).label('current_value'),
+        func.sum(Credit.amount * HYDROGEN_OFFSET_PER_UNIT).label('hydrogen_offset'),
+    )
+
+def _row_totals(row):
+    return {field: getattr(row, field) or 0 for field in TOTAL_FIELDS}
+
+def aggregate_portfolios(user_ids=None):
+    """Totals per buyer computed by the database: user id -> totals"""
+    query = (
+        db.session.query(PurchasedCredit.user_id, *_aggregate_columns())
+        .join(Credit, Credit.id == PurchasedCredit.credit_id)
+        .group_by(PurchasedCredit.user_id)
+    )
+    if user_ids is not None:
+        query = query.filter(PurchasedCredit.user_id.in_(user_ids))
+    return {row.user_id: _row_totals(row) for row in query}
+
+def portfolio_summary(user_id):
+    summary = db.session.get(BuyerPortfolioSummary, user_id)
+    if summary is None:
+        return aggregate_portfolios([user_id]).get(user_id, _empty_totals())
+    return {field: getattr(summary, field) for field in TOTAL_FIELDS}
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def _ensure_summary(user_id):
+    with db.session.no_autoflush:
+        if db.session.get(BuyerPortfolioSummary, user_id) is not None:
+            return
+        totals = aggregate_portfolios([user_id]).get(user_id, _empty_totals())
+        day = func.date(PurchasedCredit.purchase_date)
+        history = (
+            db.session.query(day.label('day'), *_aggregate_columns())
+            .join(Credit, Credit.id == PurchasedCredit.credit_id)
+            .filter(PurchasedCredit.user_id == user_id)
+            .group_by(day)
+            .all()
+        )
+        # A concurrent request seeded the buyer first: its seed plus our delta is the total
+        if not insert_missing(db.session, BuyerPortfolioSummary, [dict(user_id=user_id, **totals)]):
+            return
+        if history:
+            insert_missing(db.session, BuyerPortfolioDaily, [dict(
+                user_id=user_id, day=_as_date(row.day),
+                **{DELTA_FIELDS[field]: value for field, value in _row_totals(row).items()}
+            ) for row in history])
+
+def _apply(user_id, totals, day=None):
+    day = day or datetime.utcnow().date()
+    summary_values = {field: getattr(BuyerPortfolioSummary, field) + delta
+                      for field, delta in totals.items() if delta}
+    daily_values = {DELTA_FIELDS[field]: getattr(BuyerPortfolioDaily, DELTA_FIELDS[field]) + delta
+                    for field, delta in totals.items() if delta}
+    if not summary_values:
+        return
+    with db.session.no_autoflush:
+        insert_missing(db.session, BuyerPortfolioDaily, [dict(user_id=user_id, day=day, **{c: 0 for c in DELTA_FIELDS.values()})])
+    db.session.execute(
+        update(BuyerPortfolioSummary)
+        .where(BuyerPortfolioSummary.user_id == user_id)
+        .values(updated_at=datetime.utcnow(), **summary_values)
+    )
+    db.session.execute(
+        update(BuyerPortfolioDaily)
+        .where(BuyerPortfolioDaily.user_id == user_id, BuyerPortfolioDaily.day == day)
+        .values(**daily_values)
+    )
+
+def record_purchase(buyer_id, credit, previous_holding=None):
+    """``credit`` is bought by ``buyer_id`` at its current price, from ``previous_holding`` if resold"""
+    _ensure_summary(buyer_id)
+    if previous_holding is not None:
+        _ensure_summary(previous_holding.user_id)
+        price = previous_holding.purchase_price
+        sold = _holding_totals(credit, price if price is not None else credit.price, sign=-1)
+        if previous_holding.is_expired:
+            sold['expired_count'] = -1
+        _apply(previous_holding.user_id, sold)
+    _apply(buyer_id, _holding_totals(credit, credit.price))
+
+def record_expiry(holding):
+    if holding.is_expired:
+        return
+    _ensure_summary(holding.user_id)
+    _apply(holding.user_id, {'expired_count': 1})
+
+def portfolio_history(user_id, bucket='day', start=None, end=None):
+    """Running totals at the end of each day or month (``bucket``) with activity"""
+    baseline = _empty_totals()
+    if start is not None:
+        row = (db.session.query(*(func.sum(getattr(BuyerPortfolioDaily, column)).label(field)
+                                  for field, column in DELTA_FIELDS.items()))
+               .filter(BuyerPortfolioDaily.user_id == user_id, BuyerPortfolioDaily.day < start)
+               .one())
+        baseline = _row_totals(row)
+
+    query = BuyerPortfolioDaily.query.filter(BuyerPortfolioDaily.user_id == user_id)
+    if start is not None:
+        query = query.filter(BuyerPortfolioDaily.day >= start)
+    if end is not None:
+        query = query.filter(BuyerPortfolioDaily.day <= end)
+
+    series = []
+    running = dict(baseline)
+    for daily in query.order_by(BuyerPortfolioDaily.day.asc()):
+        for field, column in DELTA_FIELDS.items():
+            running[field] += getattr(daily, column)
+        period = daily.day.isoformat() if bucket == 'day' else daily.day.strftime('%Y-%m')
+        if series and series[-1][0] == period:
+            series[-1] = (period, dict(running))
+        else:
+            series.append((period, dict(running)))
+    return series
@@ -0,0 +1,27 @@
+"""
+Preloading the app in the gunicorn master (GUNICORN_PRELOAD, see
+gunicorn.conf.py).
+
+warm_up() runs in the master once the app is built. It loads the models, then
+freezes the garbage collector so the objects created so far are never
+traversed again. A GC pass writes to every object header it visits, which
+would copy the shared pages into each worker. after_fork() runs in each
+worker and drops state that must not be shared across processes.
+"""
+import gc
+from app import db
+
+def warm_up(app):
+    from app.ml_models.h2_verification_model import get_h2_model
+    with app.app_context():
+        get_h2_model()
+    gc.collect()
+    gc.freeze()
+
+def after_fork(app):
+    from app.utilis.certificate_renderer import init_certificates
+    with app.app_context():
+        # Connections opened by the master belong to it, workers open their own
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    init_certificates(app)
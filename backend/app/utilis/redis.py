@@ -1,18 +1,26 @@
 from redis import Redis
+from redis.exceptions import RedisError
 from config import Config
 redis_client = None
 def init_redis(app):
     global redis_client
-    redis_url = Config.REDIS_URL
+    if not app.config.get('REDIS_ENABLED'):
+        print("Redis disabled, running without cache")
+        redis_client = None
+        return
+    redis_url = app.config.get('REDIS_URL', Config.REDIS_URL)
     try:
         redis_client = Redis.from_url(
             redis_url,
             decode_responses=True,
+            # Fail fast so an unreachable Redis degrades to a cache miss instead of a hung worker
+            socket_connect_timeout=app.config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+            socket_timeout=app.config.get('REDIS_SOCKET_TIMEOUT', 0.5),
         )
         redis_client.ping()
         print("Connected to redis")
-    except ConnectionError as e:
-        print("No redis server connected")
+    except (RedisError, OSError) as e:
+        print(f"No redis server connected: {e}")
         redis_client = None
 
 def get_redis():
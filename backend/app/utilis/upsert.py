@@ -0,0 +1,28 @@
+"""
+Insert-if-missing for rows that concurrent requests may create together.
+
+``INSERT ... ON CONFLICT DO NOTHING`` on PostgreSQL and SQLite: a second
+writer of the same primary key waits for the first and then inserts nothing,
+instead of failing with an IntegrityError. Other dialects fall back to a
+check before each insert, which is not race free.
+"""
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def insert_missing(session, model, rows):
+    """Insert ``rows`` (dicts of column values) whose primary key does not exist yet.
+
+    Returns how many rows were inserted.
+    """
+    dialect = session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialect in _DIALECTS:
+        statement = _DIALECTS[dialect](model.__table__).on_conflict_do_nothing()
+        return session.execute(statement, rows).rowcount
+    inserted = 0
+    for row in rows:
+        if session.get(model, tuple(row[c.name] for c in model.__table__.primary_key)) is None:
+            session.execute(insert(model.__table__), [row])
+            inserted += 1
+    return inserted
@@ -0,0 +1,76 @@
+"""
+Change versions for credit listings.
+
+Every transaction that creates or changes credits (or the audit requests shown
+with them) stamps the affected Credit.version with the next value of the
+'credits' change counter. The version is taken in ``before_commit``, after the
+last flush, so the counter row is only locked for the final stamping UPDATE
+and the COMMIT itself rather than for the whole transaction. It still commits
+in version order, so ``version > since`` polling never skips a change.
+
+Flushed ORM changes are collected automatically. Writes that bypass the unit
+of work (bulk inserts, conditional UPDATEs) report their credit ids with
+``mark_changed()`` once they have succeeded.
+"""
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from app.models.change_counter import ChangeCounter
+from app.utilis.upsert import insert_missing
+
+CREDITS = 'credits'
+
+def init_versioning(app):
+    if not event.contains(Session, 'after_flush', _collect_changed_credits):
+        event.listen(Session, 'after_flush', _collect_changed_credits)
+        event.listen(Session, 'before_commit', _stamp_credit_versions)
+        event.listen(Session, 'after_commit', _reset_changes)
+        event.listen(Session, 'after_rollback', _reset_changes)
+
+def mark_changed(session, *credit_ids):
+    """Stamp these credits with the transaction's version when it commits"""
+    session.info.setdefault('changed_credits', set()).update(credit_ids)
+
+def next_version(session, name=CREDITS):
+    """Increment and return the counter; the row stays locked until commit"""
+    counter = ChangeCounter.__table__
+    bump = update(counter).where(counter.c.name == name).values(value=counter.c.value + 1)
+    if not session.execute(bump).rowcount:
+        # Databases created without the migration have no row yet
+        insert_missing(session, ChangeCounter, [{'name': name, 'value': 0}])
+        session.execute(bump)
+    return session.execute(select(counter.c.value).where(counter.c.name == name)).scalar_one()
+
+def current_version(session, name=CREDITS):
+    value = session.execute(select(ChangeCounter.value).where(ChangeCounter.name == name)).scalar()
+    return value or 0
+
+def _collect_changed_credits(session, flush_context):
+    from app.models.credit import Credit
+    from app.models.request import Request
+
+    changed = set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Credit):
+            if obj in session.new or session.is_modified(obj, include_collections=False):
+                changed.add(obj.id)
+        elif isinstance(obj, Request) and obj.credit_id is not None:
+            if obj in session.new or session.is_modified(obj, include_collections=False):
+                changed.add(obj.credit_id)
+    if changed:
+        mark_changed(session, *changed)
+
+def _stamp_credit_versions(session):
+    from app.models.credit import Credit
+
+    session.flush()
+    credit_ids = sorted(session.info.pop('changed_credits', ()))
+    if not credit_ids:
+        return
+    # Lock the credits before the counter, so the counter is always the last
+    # lock a transaction waits for and cannot be part of a deadlock
+    session.execute(select(Credit.id).where(Credit.id.in_(credit_ids)).order_by(Credit.id).with_for_update())
+    version = next_version(session)
+    session.execute(update(Credit.__table__).where(Credit.__table__.c.id.in_(credit_ids)).values(version=version))
+
+def _reset_changes(session, *args):
+    session.info.pop('changed_credits', None)
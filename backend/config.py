@@ -4,19 +4,81 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def engine_options(uri):
+    """Connection pool settings for one database URI"""
+    options = {
+        "pool_recycle": int(os.getenv('DB_POOL_RECYCLE', '240')),  # Recycle connections before Neon shuts down
+        # Check connection status before queries; costs a round trip per checkout
+        "pool_pre_ping": os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+    if not uri.startswith('sqlite'):
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        )
+    return options
+
 class Config:
     # Use environment variable if available, else default to SQLite for quick setup
     SQLALCHEMY_DATABASE_URI = os.getenv(
         'POSTGRES_URI',
         'sqlite:///carbon_credit.db'  # SQLite for quick setup
     )
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_recycle": 240,  # Recycle connections before Neon shuts down
-        "pool_pre_ping": True,  # Check connection status before queries
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # Optional read replica for @read_only views; a copy of a local SQLite file works for testing
+    SQLALCHEMY_REPLICA_URI = os.getenv('POSTGRES_REPLICA_URI')
+    SQLALCHEMY_BINDS = {
+        'replica': {'url': SQLALCHEMY_REPLICA_URI, **engine_options(SQLALCHEMY_REPLICA_URI)}
+    } if SQLALCHEMY_REPLICA_URI else {}
+    # Milliseconds, applied per connection on PostgreSQL; 0 disables
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # create_all() on every boot; off by default, create the schema with
+    # `flask init-db` (new database) or `flask db upgrade` (existing one)
+    AUTO_CREATE_SCHEMA = os.getenv('AUTO_CREATE_SCHEMA', 'false').lower() == 'true'
     JWT_SECRET_KEY = 'your-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     REDIS_URL = os.getenv('REDIS_URL',
                           'redis://localhost:6379'
     )
+    REDIS_ENABLED = os.getenv('REDIS_ENABLED', 'false').lower() == 'true'
+    REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '0.5'))
+    # Bump CACHE_VERSION to orphan every cached entry after a payload format change
+    CACHE_NAMESPACE = os.getenv('CACHE_NAMESPACE', 'h2cc')
+    CACHE_VERSION = os.getenv('CACHE_VERSION', '1')
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', '300'))
+    # Seconds a listing rebuild may hold its lock before another worker takes over
+    CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', '5'))
+    # Marketplace listing shards, and age after which they are refreshed in the background
+    MARKET_PAGE_SIZE = int(os.getenv('MARKET_PAGE_SIZE', '100'))
+    MARKET_SOFT_TTL = int(os.getenv('MARKET_SOFT_TTL', '30'))
+    # Password hashing / CAPTCHA execution: 'inline' or 'threadpool'
+    AUTH_EXECUTION_MODE = os.getenv('AUTH_EXECUTION_MODE', 'inline')
+    AUTH_POOL_SIZE = int(os.getenv('AUTH_POOL_SIZE', '4'))
+    AUTH_QUEUE_SIZE = int(os.getenv('AUTH_QUEUE_SIZE', '16'))
+    AUTH_TIMEOUT = float(os.getenv('AUTH_TIMEOUT', '5'))
+    # 'turnstile' or 'stub' (always passes, for local development and load tests)
+    CAPTCHA_BACKEND = os.getenv('CAPTCHA_BACKEND', 'turnstile')
+    CAPTCHA_TIMEOUT = float(os.getenv('CAPTCHA_TIMEOUT', '3'))
+    TURNSTILE_SECRET_KEY = os.getenv('SECRET_KEY', '1x0000000000000000000000000000000AA')
+    # WeasyPrint PDF render processes, 0 serves HTML certificates only
+    CERTIFICATE_PDF_WORKERS = int(os.getenv('CERTIFICATE_PDF_WORKERS', '0'))
+    CERTIFICATE_CACHE_SIZE = int(os.getenv('CERTIFICATE_CACHE_SIZE', '256'))
+    # Per-endpoint timing, SQL/Redis/ML counters served at /api/metrics
+    INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+    # Log statements repeated N_PLUS_ONE_THRESHOLD times in one request, add X-Query-* headers
+    INSTRUMENTATION_DEBUG = os.getenv('INSTRUMENTATION_DEBUG', 'false').lower() == 'true'
+    N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+    # Seconds before the in-memory recommendation index is rebuilt even without listing changes
+    RECOMMENDATION_INDEX_TTL = int(os.getenv('RECOMMENDATION_INDEX_TTL', '300'))
+    # /api/stream: seconds between keep-alive comments, events buffered per slow client
+    EVENT_HEARTBEAT = int(os.getenv('EVENT_HEARTBEAT', '15'))
+    EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '100'))
+    # Seconds the in-memory auditor pool is trusted before reloading ids and workload
+    AUDITOR_POOL_TTL = int(os.getenv('AUDITOR_POOL_TTL', '30'))
+    # Per-worker cache of token user id -> user, see app/utilis/identity.py
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))
+    # Trained per method/location efficiency baselines, see `flask train-anomaly-model`
+    ANOMALY_MODEL_PATH = os.getenv('ANOMALY_MODEL_PATH', 'instance/anomaly_model.joblib')
@@ -0,0 +1,46 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+The gevent worker serves each request on a greenlet, so thousands of idle
+/api/stream connections share a few workers instead of pinning one sync
+worker each. Set GUNICORN_WORKER_CLASS=sync to go back to plain workers.
+
+With GUNICORN_PRELOAD (the default) the app and models are built once in the
+master and workers are forked from it, sharing those pages copy-on-write
+instead of each importing and building its own copy.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+# Concurrent connections per gevent worker, open event streams included
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '2000'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+if preload_app and worker_class == 'gevent':
+    # The app is imported in the master, so patch before that rather than
+    # after fork, or locks and sockets created at import stay unpatched
+    from gevent import monkey
+    monkey.patch_all()
+
+def when_ready(server):
+    if preload_app:
+        from app.utilis.prefork import warm_up
+        warm_up(server.app.wsgi())
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.utilis.prefork import after_fork
+        after_fork(server.app.wsgi())
+    if worker_class != 'gevent':
+        return
+    try:
+        # psycopg2 blocks the whole worker unless it yields to gevent
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        server.log.warning("psycogreen or psycopg2 not installed, database calls will block other greenlets")
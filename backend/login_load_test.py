@@ -0,0 +1,78 @@
+"""
+Login load test for the Carbon Credit Platform backend.
+
+Fires concurrent POST /api/login requests and reports latency percentiles, so
+AUTH_EXECUTION_MODE=inline and AUTH_EXECUTION_MODE=threadpool can be compared
+on the same deployment.
+
+    python login_load_test.py --url http://127.0.0.1:5000 --concurrency 32 --requests 500
+
+Run the server with CAPTCHA_BACKEND=stub when using --signup to create the
+load-test account.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def main():
+    parser = argparse.ArgumentParser(description="Login latency under concurrency")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--username', default='loadtest_buyer')
+    parser.add_argument('--password', default='sepolia')
+    parser.add_argument('--role', default='buyer')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--signup', action='store_true', help="create the account before the run")
+    args = parser.parse_args()
+
+    if args.signup:
+        response = requests.post(f"{args.url}/api/signup", json={
+            'username': args.username,
+            'email': f"{args.username}@example.com",
+            'password': args.password,
+            'role': args.role,
+        })
+        print(f"Signup: {response.status_code} {response.text.strip()}")
+
+    # One pooled session per worker thread
+    session_pool = {}
+    def login(_):
+        session = session_pool.setdefault(threading.get_ident(), requests.Session())
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{args.url}/api/login", json={
+                'username': args.username,
+                'password': args.password,
+                'role': args.role,
+            }, timeout=30)
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        return time.perf_counter() - start, status
+
+    print(f"Running {args.requests} logins with concurrency {args.concurrency} against {args.url}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(login, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    print(f"Status codes: {statuses}")
+    print(f"Throughput:   {len(results) / elapsed:.1f} req/s")
+    print(f"Latency (ms): p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} "
+          f"p99={percentile(latencies, 99):.1f} max={latencies[-1]:.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""normalize auditor assignments into auditor_association
+
+Revision ID: 3f1c2a7d9b10
+Revises: 
+Create Date: 2026-10-18 10:12:41.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _parse_ids(value):
+    # Lists were written to the old String(500) columns either as JSON
+    # ('[1, 2]') or, through psycopg2's list adaptation, as array literals ('{1,2}')
+    if not value:
+        return []
+    value = value.strip()
+    if value.startswith('{') and value.endswith('}'):
+        value = '[' + value[1:-1] + ']'
+    try:
+        return [int(v) for v in json.loads(value)]
+    except (ValueError, TypeError):
+        return []
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # db.create_all() may already have created the table on boot
+    if 'auditor_association' not in inspector.get_table_names():
+        op.create_table(
+            'auditor_association',
+            sa.Column('credit_id', sa.Integer(), sa.ForeignKey('credits.id'), primary_key=True),
+            sa.Column('auditor_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('pending', sa.Boolean(), nullable=False, server_default=sa.true()),
+        )
+    elif 'pending' not in [c['name'] for c in inspector.get_columns('auditor_association')]:
+        with op.batch_alter_table('auditor_association') as batch_op:
+            batch_op.add_column(sa.Column('pending', sa.Boolean(), nullable=False, server_default=sa.true()))
+
+    existing_indexes = [i['name'] for i in sa.inspect(bind).get_indexes('auditor_association')]
+    if 'ix_auditor_association_auditor_pending' not in existing_indexes:
+        op.create_index('ix_auditor_association_auditor_pending', 'auditor_association', ['auditor_id', 'pending'])
+
+    credits = sa.table('credits', sa.column('id', sa.Integer), sa.column('auditors', sa.Text))
+    requests = sa.table('requests', sa.column('id', sa.Integer), sa.column('credit_id', sa.Integer),
+                        sa.column('auditors', sa.Text))
+    association = sa.table('auditor_association', sa.column('credit_id', sa.Integer),
+                           sa.column('auditor_id', sa.Integer), sa.column('pending', sa.Boolean))
+
+    assigned = {row.id: _parse_ids(row.auditors)
+                for row in bind.execute(sa.select(credits.c.id, credits.c.auditors))}
+    request_rows = [(row.id, row.credit_id, _parse_ids(row.auditors))
+                    for row in bind.execute(sa.select(requests.c.id, requests.c.credit_id, requests.c.auditors))]
+    remaining = {}
+    for _, credit_id, ids in request_rows:
+        remaining.setdefault(credit_id, set()).update(ids)
+
+    already_linked = {(row.credit_id, row.auditor_id)
+                      for row in bind.execute(sa.select(association.c.credit_id, association.c.auditor_id))}
+    rows = [
+        {'credit_id': credit_id, 'auditor_id': auditor_id, 'pending': auditor_id in remaining.get(credit_id, ())}
+        for credit_id, ids in assigned.items()
+        for auditor_id in dict.fromkeys(ids)
+        if (credit_id, auditor_id) not in already_linked
+    ]
+    if rows:
+        op.bulk_insert(association, rows)
+
+    # Rewrite the lists as JSON text so the columns can be read through sa.JSON
+    for credit_id, ids in assigned.items():
+        bind.execute(credits.update().where(credits.c.id == credit_id).values(auditors=json.dumps(ids)))
+    for request_id, _, ids in request_rows:
+        bind.execute(requests.update().where(requests.c.id == request_id).values(auditors=json.dumps(ids)))
+
+    # SQLite keeps JSON as text, only Postgres needs a real column type change
+    if bind.dialect.name == 'postgresql':
+        for table in ('credits', 'requests'):
+            op.alter_column(table, 'auditors', existing_type=sa.String(length=500), type_=sa.JSON(),
+                            postgresql_using='auditors::json')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for table in ('credits', 'requests'):
+            op.alter_column(table, 'auditors', existing_type=sa.JSON(), type_=sa.String(length=500),
+                            postgresql_using='auditors::text')
+
+    op.drop_index('ix_auditor_association_auditor_pending', table_name='auditor_association')
+    op.drop_table('auditor_association')
@@ -0,0 +1,26 @@
+"""index purchased credits by buyer and purchase date
+
+Revision ID: 5b7e1d93c4f2
+Revises: c2d9e7b41a06
+Create Date: 2026-10-18 13:02:41.518304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e1d93c4f2'
+down_revision = 'c2d9e7b41a06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = [i['name'] for i in sa.inspect(op.get_bind()).get_indexes('purchased_credits')]
+    if 'ix_purchased_credits_user_date' not in existing:
+        op.create_index('ix_purchased_credits_user_date', 'purchased_credits', ['user_id', 'purchase_date'])
+
+
+def downgrade():
+    op.drop_index('ix_purchased_credits_user_date', table_name='purchased_credits')
@@ -0,0 +1,36 @@
+"""unique txn_hash as the purchase idempotency key
+
+Revision ID: 7d2f9a0c5e18
+Revises: e4a81f6c2b97
+Create Date: 2026-10-18 14:20:53.904126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2f9a0c5e18'
+down_revision = 'e4a81f6c2b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = [i['name'] for i in sa.inspect(bind).get_indexes('transactions')]
+    if 'uq_transactions_txn_hash' in existing:
+        return
+    duplicates = bind.execute(sa.text(
+        'SELECT txn_hash FROM transactions GROUP BY txn_hash HAVING COUNT(*) > 1'
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            f"{len(duplicates)} txn_hash value(s) are recorded more than once (e.g. {duplicates[0]!r}); "
+            "resolve the duplicate transactions before adding the unique index"
+        )
+    op.create_index('uq_transactions_txn_hash', 'transactions', ['txn_hash'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_transactions_txn_hash', table_name='transactions')
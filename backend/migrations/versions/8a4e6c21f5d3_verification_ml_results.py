@@ -0,0 +1,38 @@
+"""store ML verification results per model version
+
+Revision ID: 8a4e6c21f5d3
+Revises: 3f1c2a7d9b10
+Create Date: 2026-10-18 11:02:17.540219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6c21f5d3'
+down_revision = '3f1c2a7d9b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'verification_ml_results' in sa.inspect(op.get_bind()).get_table_names():
+        return  # already created by db.create_all()
+    op.create_table(
+        'verification_ml_results',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('verification_request_id', sa.Integer(), sa.ForeignKey('verification_requests.id'), nullable=False),
+        sa.Column('model_version', sa.String(length=20), nullable=False),
+        sa.Column('is_valid', sa.Boolean(), nullable=False),
+        sa.Column('composite_score', sa.Float(), nullable=False),
+        sa.Column('fraud_probability', sa.Float(), nullable=False),
+        sa.Column('confidence_level', sa.Float(), nullable=False),
+        sa.Column('result', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('verification_request_id', 'model_version', name='uq_ml_result_request_version'),
+    )
+
+
+def downgrade():
+    op.drop_table('verification_ml_results')
@@ -0,0 +1,48 @@
+"""change counters and credit versions for delta polling
+
+Revision ID: a93c5e7f1d24
+Revises: 7d2f9a0c5e18
+Create Date: 2026-10-18 15:07:36.612490
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93c5e7f1d24'
+down_revision = '7d2f9a0c5e18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if 'change_counters' not in inspector.get_table_names():
+        op.create_table(
+            'change_counters',
+            sa.Column('name', sa.String(length=50), primary_key=True),
+            sa.Column('value', sa.BigInteger(), nullable=False),
+        )
+    if 'version' not in [c['name'] for c in inspector.get_columns('credits')]:
+        op.add_column('credits', sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'))
+
+    existing = [i['name'] for i in inspector.get_indexes('credits')]
+    if 'ix_credits_version' not in existing:
+        op.create_index('ix_credits_version', 'credits', ['version'])
+    if 'ix_credits_creator_version' not in existing:
+        op.create_index('ix_credits_creator_version', 'credits', ['creator_id', 'version'])
+
+    # Existing credits stay at version 0, so any since >= 0 starts after them
+    if bind.execute(sa.text("SELECT COUNT(*) FROM change_counters WHERE name = 'credits'")).scalar() == 0:
+        op.execute("INSERT INTO change_counters (name, value) VALUES ('credits', 0)")
+
+
+def downgrade():
+    op.drop_index('ix_credits_creator_version', table_name='credits')
+    op.drop_index('ix_credits_version', table_name='credits')
+    with op.batch_alter_table('credits') as batch_op:
+        batch_op.drop_column('version')
+    op.drop_table('change_counters')
@@ -0,0 +1,29 @@
+"""composite indexes for transaction ledger pagination
+
+Revision ID: c2d9e7b41a06
+Revises: 8a4e6c21f5d3
+Create Date: 2026-10-18 11:48:05.221730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d9e7b41a06'
+down_revision = '8a4e6c21f5d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = [i['name'] for i in sa.inspect(op.get_bind()).get_indexes('transactions')]
+    if 'ix_transactions_timestamp_id' not in existing:
+        op.create_index('ix_transactions_timestamp_id', 'transactions', ['timestamp', 'id'])
+    if 'ix_transactions_credit_timestamp_id' not in existing:
+        op.create_index('ix_transactions_credit_timestamp_id', 'transactions', ['credit_id', 'timestamp', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_transactions_credit_timestamp_id', table_name='transactions')
+    op.drop_index('ix_transactions_timestamp_id', table_name='transactions')
@@ -0,0 +1,27 @@
+"""facility location on verification requests
+
+Revision ID: d5e2b8a4f619
+Revises: a93c5e7f1d24
+Create Date: 2026-10-18 17:42:10.208331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e2b8a4f619'
+down_revision = 'a93c5e7f1d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'location' not in [c['name'] for c in inspector.get_columns('verification_requests')]:
+        op.add_column('verification_requests', sa.Column('location', sa.String(length=100), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('verification_requests') as batch_op:
+        batch_op.drop_column('location')
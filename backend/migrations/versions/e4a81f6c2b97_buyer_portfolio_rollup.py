@@ -0,0 +1,82 @@
+"""buyer portfolio summary and daily rollup
+
+Revision ID: e4a81f6c2b97
+Revises: 5b7e1d93c4f2
+Create Date: 2026-10-18 13:41:09.327715
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a81f6c2b97'
+down_revision = '5b7e1d93c4f2'
+branch_labels = None
+depends_on = None
+
+# Mirrors app.utilis.portfolio: price paid (current price for older rows),
+# mock performance of (credit id % 100) - 50 percent, 0.5 offset per unit
+AGGREGATES = """
+    COUNT(pc.id),
+    SUM(CASE WHEN pc.is_expired THEN 1 ELSE 0 END),
+    SUM(COALESCE(pc.purchase_price, c.price)),
+    SUM(COALESCE(pc.purchase_price, c.price) * (1 + ((c.id % 100) - 50) / 100.0)),
+    SUM(c.amount * 0.5)
+"""
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = inspector.get_table_names()
+
+    if 'purchase_price' not in [c['name'] for c in inspector.get_columns('purchased_credits')]:
+        op.add_column('purchased_credits', sa.Column('purchase_price', sa.Float(), nullable=True))
+
+    if 'buyer_portfolio_summaries' not in tables:
+        op.create_table(
+            'buyer_portfolio_summaries',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('credits_count', sa.Integer(), nullable=False),
+            sa.Column('expired_count', sa.Integer(), nullable=False),
+            sa.Column('total_invested', sa.Float(), nullable=False),
+            sa.Column('current_value', sa.Float(), nullable=False),
+            sa.Column('hydrogen_offset', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+    if 'buyer_portfolio_daily' not in tables:
+        op.create_table(
+            'buyer_portfolio_daily',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('day', sa.Date(), primary_key=True),
+            sa.Column('credits_delta', sa.Integer(), nullable=False),
+            sa.Column('expired_delta', sa.Integer(), nullable=False),
+            sa.Column('invested_delta', sa.Float(), nullable=False),
+            sa.Column('value_delta', sa.Float(), nullable=False),
+            sa.Column('offset_delta', sa.Float(), nullable=False),
+        )
+
+    # Seed the rollup from existing holdings
+    if bind.execute(sa.text('SELECT COUNT(*) FROM buyer_portfolio_summaries')).scalar() == 0:
+        op.execute(f"""
+            INSERT INTO buyer_portfolio_summaries
+                (user_id, credits_count, expired_count, total_invested, current_value, hydrogen_offset, updated_at)
+            SELECT pc.user_id, {AGGREGATES}, CURRENT_TIMESTAMP
+            FROM purchased_credits pc JOIN credits c ON c.id = pc.credit_id
+            GROUP BY pc.user_id
+        """)
+        op.execute(f"""
+            INSERT INTO buyer_portfolio_daily
+                (user_id, day, credits_delta, expired_delta, invested_delta, value_delta, offset_delta)
+            SELECT pc.user_id, DATE(pc.purchase_date), {AGGREGATES}
+            FROM purchased_credits pc JOIN credits c ON c.id = pc.credit_id
+            GROUP BY pc.user_id, DATE(pc.purchase_date)
+        """)
+
+
+def downgrade():
+    op.drop_table('buyer_portfolio_daily')
+    op.drop_table('buyer_portfolio_summaries')
+    with op.batch_alter_table('purchased_credits') as batch_op:
+        batch_op.drop_column('purchase_price')
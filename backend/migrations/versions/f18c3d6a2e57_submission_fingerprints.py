@@ -0,0 +1,45 @@
+"""submission fingerprints for duplicate claim detection
+
+Revision ID: f18c3d6a2e57
+Revises: d5e2b8a4f619
+Create Date: 2026-10-18 19:26:48.731052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f18c3d6a2e57'
+down_revision = 'd5e2b8a4f619'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'submission_fingerprints' in sa.inspect(op.get_bind()).get_table_names():
+        return  # already created by db.create_all()
+    op.create_table(
+        'submission_fingerprints',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('verification_request_id', sa.Integer(), sa.ForeignKey('verification_requests.id'),
+                  nullable=False, unique=True),
+        sa.Column('facility', sa.String(length=120), nullable=False),
+        sa.Column('production_date', sa.Date(), nullable=False),
+        sa.Column('energy_mwh', sa.Float(), nullable=False),
+        sa.Column('h2_kg', sa.Float(), nullable=False),
+        sa.Column('exact_hash', sa.String(length=64), nullable=False),
+        sa.Column('bucket', sa.String(length=64), nullable=False),
+        sa.Column('duplicate_of', sa.Integer(), sa.ForeignKey('verification_requests.id'), nullable=True),
+        sa.Column('match', sa.String(length=10), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_submission_fingerprints_exact_hash', 'submission_fingerprints', ['exact_hash'])
+    op.create_index('ix_submission_fingerprints_bucket', 'submission_fingerprints', ['bucket'])
+    # Existing requests are indexed by `flask rescan-duplicates`
+
+
+def downgrade():
+    op.drop_index('ix_submission_fingerprints_bucket', table_name='submission_fingerprints')
+    op.drop_index('ix_submission_fingerprints_exact_hash', table_name='submission_fingerprints')
+    op.drop_table('submission_fingerprints')
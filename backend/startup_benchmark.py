@@ -0,0 +1,74 @@
+"""
+Worker cold start benchmark for the Carbon Credit Platform backend.
+
+Starts a fresh interpreter per run, as a new gunicorn worker would, and
+reports how long importing the app, create_app() and the first request take.
+Each run uses the database and settings from the environment.
+
+    python startup_benchmark.py --runs 10
+    python startup_benchmark.py --runs 5 --imports 15   # also list the slowest imports
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+with app.test_client() as client:
+    client.get('/api/health')
+served = time.perf_counter()
+print('STARTUP ' + json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'total': served - start,
+}))
+"""
+
+def run_once(importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    proc = subprocess.run(command, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    line = next((l for l in proc.stdout.splitlines() if l.startswith('STARTUP ')), None)
+    if proc.returncode != 0 or line is None:
+        raise RuntimeError(f"startup failed:\n{proc.stderr[-2000:]}")
+    return json.loads(line[len('STARTUP '):]), proc.stderr
+
+def slowest_imports(stderr, limit):
+    """Top-level packages by cumulative import time from -X importtime output"""
+    totals = {}
+    for match in re.finditer(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', stderr):
+        cumulative, indent, module = int(match.group(1)), match.group(2), match.group(3)
+        if len(indent) == 1:
+            totals[module] = totals.get(module, 0) + cumulative
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start time per worker")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--imports', type=int, default=0, help="show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    samples = [run_once()[0] for _ in range(args.runs)]
+    print(f"{args.runs} cold starts (seconds)")
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        values = sorted(s[phase] for s in samples)
+        print(f"  {phase:<14} median {statistics.median(values):.3f}  min {values[0]:.3f}  max {values[-1]:.3f}")
+
+    if args.imports:
+        _, stderr = run_once(importtime=True)
+        print("Slowest imports (cumulative ms)")
+        for module, micros in slowest_imports(stderr, args.imports):
+            print(f"  {module:<40} {micros / 1000:.1f}")
+
+if __name__ == '__main__':
+    main()